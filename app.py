@@ -3,71 +3,177 @@ import streamlit as st
 from pathlib import Path
 import sys
 import os
+import re
+import time
+import textwrap
 import uuid
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from io import BytesIO
+from xml.sax.saxutils import escape
+from typing import Optional
+
+# Add path for local imports (once - `streamlit run app.py` re-executes this on every rerun)
+ROOT = str(Path(__file__).parent)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from clients import get_file_manager
+from text_extraction import extract_and_chunk, get_preview_text
+from chunking import KeywordIndex
+from retriever import VectorIndex, embed_chunks, embed_query, find_semantic_chunks
+from qa_cache import SemanticCache
+from qa import AnswerStream, get_available_models, DEFAULT_MODEL, CONTEXT_CHUNKS
+
+UPLOAD_TYPES = ('pdf', 'docx', 'txt', 'png', 'jpg', 'jpeg')
+COUNTRIES = ("Pakistan", "India", "USA", "UK", "Canada", "UAE")
+DOC_TYPES = ("Ordinance", "Act", "Course Material", "Student Material", "Policy", "Report", "Other")
+FILTER_COUNTRIES = ("All",) + COUNTRIES
+FILTER_DOC_TYPES = ("All",) + DOC_TYPES
+DOCS_PER_PAGE = 10
+QA_HISTORY_LIMIT = 50
+CORPUS_STAMP_TTL = 30  # seconds between database corpus-version checks
+DOCUMENT_LIST_TTL = 60  # seconds a cached document list/search page is kept
+
+_BLANK_LINE_RE = re.compile(r'\n\s*\n')
 
-# Add path for local imports
-sys.path.append(str(Path(__file__).parent))
+# === EXPORT FUNCTIONS ===
+# reportlab and python-docx are imported inside the exporters so sessions
+# that never export don't pay their import cost at startup.
+@st.cache_resource
+def _pdf_styles() -> dict:
+    """PDF styles are immutable once built, so share one set across exports."""
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20),
+        'normal': ParagraphStyle('Normal', parent=styles['Normal'], fontSize=10, spaceBefore=6, spaceAfter=6),
+        'heading': ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=12, spaceBefore=15, spaceAfter=8),
+    }
 
-from supabase_client import SupabaseManager
-from text_extraction import extract_text, get_preview_text
-from chunking import chunk_text, find_relevant_chunks
-from qa import get_answer_from_chunks, get_available_models, DEFAULT_MODEL
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from docx import Document
 
-# === EXPORT FUNCTIONS ===
+def _response_type(data: dict) -> str:
+    if data.get('used_general_knowledge', False):
+        return "General Knowledge + Document Context"
+    if not data.get('has_document_context', True):
+        return "General Knowledge"
+    return "Document-Based"
+
+
+# Short answers without sources skip the flowable layout engine entirely
+SIMPLE_PDF_MAX_CHARS = 2000
+SIMPLE_PDF_WRAP = 90
+
+
+def _create_simple_pdf(data: dict) -> bytes:
+    """Draw a short, source-less answer straight onto a canvas."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    y = height - 72
+
+    def draw(text, font="Helvetica", size=10, gap=14):
+        nonlocal y
+        for line in textwrap.wrap(text, SIMPLE_PDF_WRAP) or ['']:
+            if y < 72:
+                c.showPage()
+                y = height - 72
+            c.setFont(font, size)
+            c.drawString(72, y, line)
+            y -= gap
+
+    draw("Document Q&A Response", "Helvetica-Bold", 18, 32)
+    draw(f"Date: {data['timestamp']}")
+    draw(f"Model: {data['model']}")
+    draw(f"Type: {_response_type(data)}")
+    y -= 14
+    draw("Question:", "Helvetica-Bold", 12, 18)
+    draw(data['question'])
+    y -= 8
+    draw("Answer:", "Helvetica-Bold", 12, 18)
+    for block in _BLANK_LINE_RE.split(data['answer']):
+        for line in block.split('\n'):
+            if line.strip():
+                draw(line.strip())
+        y -= 6
+
+    c.save()
+    return buffer.getvalue()
+
+
+# Cached so Streamlit reruns reuse the built bytes instead of rebuilding them
+@st.cache_data(show_spinner=False, max_entries=64)
 def create_pdf_export(data: dict) -> bytes:
+    if len(data['answer']) < SIMPLE_PDF_MAX_CHARS and not data['sources']:
+        return _create_simple_pdf(data)
+
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    styles = _pdf_styles()
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
-    styles = getSampleStyleSheet()
     story = []
 
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, spaceAfter=20)
-    story.append(Paragraph("Document Q&A Response", title_style))
+    story.append(Paragraph("Document Q&A Response", styles['title']))
     story.append(Spacer(1, 12))
 
-    normal_style = ParagraphStyle('Normal', parent=styles['Normal'], fontSize=10, spaceBefore=6, spaceAfter=6)
-    story.append(Paragraph(f"Date: {data['timestamp']}", normal_style))
-    story.append(Paragraph(f"Model: {data['model']}", normal_style))
+    story.append(Paragraph(f"Date: {data['timestamp']}", styles['normal']))
+    story.append(Paragraph(f"Model: {data['model']}", styles['normal']))
 
-    if data.get('used_general_knowledge', False):
-        response_type = "General Knowledge + Document Context"
-    elif not data.get('has_document_context', True):
-        response_type = "General Knowledge"
-    else:
-        response_type = "Document-Based"
-
-    story.append(Paragraph(f"Type: {response_type}", normal_style))
+    response_type = _response_type(data)
+    story.append(Paragraph(f"Type: {response_type}", styles['normal']))
     story.append(Spacer(1, 20))
 
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=12, spaceBefore=15, spaceAfter=8)
-    story.append(Paragraph("Question:", heading_style))
-    story.append(Paragraph(data['question'], normal_style))
+    story.append(Paragraph("Question:", styles['heading']))
+    story.append(Paragraph(escape(data['question']), styles['normal']))
     story.append(Spacer(1, 12))
 
-    story.append(Paragraph("Answer:", heading_style))
-    for line in data['answer'].split('\n'):
-        if line.strip():
-            story.append(Paragraph(line.strip(), normal_style))
-        else:
+    story.append(Paragraph("Answer:", styles['heading']))
+    # One flowable per blank-line separated block instead of one per line
+    for block in _BLANK_LINE_RE.split(data['answer']):
+        lines = [escape(line.strip()) for line in block.splitlines() if line.strip()]
+        if lines:
+            story.append(Paragraph('<br/>'.join(lines), styles['normal']))
             story.append(Spacer(1, 6))
 
     if data['sources']:
         story.append(Spacer(1, 12))
-        story.append(Paragraph("Sources:", heading_style))
+        story.append(Paragraph("Sources:", styles['heading']))
         for source in data['sources']:
-            story.append(Paragraph(f"• {source}", normal_style))
+            story.append(Paragraph(f"• {escape(source)}", styles['normal']))
 
     doc.build(story)
-    buffer.seek(0)
-    return buffer.read()
+    return buffer.getvalue()
+
 
+def _docx_paragraph_xml(lines: list):
+    """Build a <w:p> element holding the lines separated by <w:br/>."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
 
+    paragraph = OxmlElement('w:p')
+    run = OxmlElement('w:r')
+    for i, line in enumerate(lines):
+        if i:
+            run.append(OxmlElement('w:br'))
+        text = OxmlElement('w:t')
+        text.set(qn('xml:space'), 'preserve')
+        text.text = line
+        run.append(text)
+    paragraph.append(run)
+    return paragraph
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
 def create_docx_export(data: dict) -> bytes:
+    from docx import Document
+
     buffer = BytesIO()
     doc = Document()
 
@@ -75,22 +181,20 @@ def create_docx_export(data: dict) -> bytes:
     doc.add_paragraph(f'Date: {data["timestamp"]}')
     doc.add_paragraph(f'Model: {data["model"]}')
 
-    if data.get('used_general_knowledge', False):
-        response_type = "General Knowledge + Document Context"
-    elif not data.get('has_document_context', True):
-        response_type = "General Knowledge"
-    else:
-        response_type = "Document-Based"
-
+    response_type = _response_type(data)
     doc.add_paragraph(f'Type: {response_type}')
     doc.add_paragraph()
 
     doc.add_heading('Question:', level=1)
     doc.add_paragraph(data['question'])
     doc.add_heading('Answer:', level=1)
-    for line in data['answer'].split('\n'):
-        if line.strip():
-            doc.add_paragraph(line.strip())
+    # Append one <w:p> per answer block straight into the body XML,
+    # skipping python-docx's per-paragraph element factory
+    body = doc.element.body
+    for block in _BLANK_LINE_RE.split(data['answer']):
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        if lines:
+            body.insert_element_before(_docx_paragraph_xml(lines), 'w:sectPr')
 
     if data['sources']:
         doc.add_heading('Sources:', level=1)
@@ -98,8 +202,180 @@ def create_docx_export(data: dict) -> bytes:
             doc.add_paragraph(f'• {source}', style='List Bullet')
 
     doc.save(buffer)
-    buffer.seek(0)
-    return buffer.read()
+    return buffer.getvalue()
+
+
+def render_downloads(export_data: dict) -> None:
+    """PDF/DOCX download buttons; reruns with the same answer hit the export cache."""
+    st.markdown("---")
+    st.markdown("#### 💾 Download Response")
+    
+    pdf_data = create_pdf_export(export_data)
+    docx_data = create_docx_export(export_data)
+    
+    file_stamp = datetime.strptime(export_data['timestamp'], "%Y-%m-%d %H:%M:%S").strftime('%Y%m%d_%H%M%S')
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            label="📄 Download PDF",
+            data=pdf_data,
+            file_name=f"ai_answer_{file_stamp}.pdf",
+            mime="application/pdf"
+        )
+    with col2:
+        st.download_button(
+            label="📝 Download DOCX",
+            data=docx_data,
+            file_name=f"ai_answer_{file_stamp}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+
+
+# === SHARED RESOURCES ===
+@st.cache_resource
+def get_corpus_version() -> dict:
+    """Process-wide document counter, bumped on upload/delete for every session."""
+    return {'value': 0}
+
+
+def bump_corpus_version() -> None:
+    get_corpus_version()['value'] += 1
+
+
+@st.cache_data(ttl=CORPUS_STAMP_TTL, show_spinner=False)
+def _fetch_corpus_stamp(_file_manager, local_version: int) -> Optional[str]:
+    """Database-side corpus fingerprint; local_version only keys the cache."""
+    return _file_manager.get_corpus_stamp()
+
+
+def current_corpus_version(file_manager) -> tuple:
+    """
+    Local upload/delete counter plus the database's fingerprint, so
+    changes made by other app instances also invalidate cached chunks.
+    """
+    local_version = get_corpus_version()['value']
+    return (local_version, _fetch_corpus_stamp(file_manager, local_version))
+
+
+@st.cache_resource
+def get_qa_cache() -> SemanticCache:
+    """Answer cache shared by all sessions, so repeat questions skip Gemini."""
+    return SemanticCache()
+
+
+def qa_cache_scope(file_manager, user_id: str, user_role: str, model: str) -> tuple:
+    """
+    Sessions that see the same documents share cached answers: all admins
+    share one scope, users get their own. Uploads/deletes start a new scope.
+    """
+    owner = None if user_role == 'admin' else user_id
+    return (current_corpus_version(file_manager), user_role, owner, model)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_all_chunks(_file_manager, user_id: str, user_role: str, corpus_version: tuple) -> list:
+    """Corpus fetch shared across sessions; corpus_version only keys the cache."""
+    return _file_manager.get_all_chunks(user_id, user_role)
+
+
+def get_cached_chunks(file_manager, user_id: str, user_role: str) -> list:
+    """
+    Reuse the chunk list until an upload/delete changes the corpus version.
+    The session keeps the same list object so its search indexes stay valid.
+    """
+    key = (user_id, user_role, current_corpus_version(file_manager))
+    chunks = st.session_state.chunks_cache.get(key)
+    if chunks is None:
+        chunks = _fetch_all_chunks(file_manager, *key)
+        st.session_state.chunks_cache = {key: chunks}
+    return chunks
+
+
+@st.cache_data(ttl=DOCUMENT_LIST_TTL, show_spinner=False)
+def _fetch_document_page(_file_manager, user_id: str, user_role: str, keyword: str,
+                         country: str, doc_type: str, page: int, corpus_version: tuple) -> tuple:
+    """Document list/search page shared across reruns; corpus_version only keys the cache."""
+    offset = page * DOCS_PER_PAGE
+    if keyword:
+        return _file_manager.search_documents_page(
+            user_id, user_role, keyword, offset, DOCS_PER_PAGE
+        )
+    return _file_manager.get_documents_page(
+        user_id, user_role, country, doc_type, offset, DOCS_PER_PAGE
+    )
+
+
+def get_document_page(file_manager, user_id: str, user_role: str, keyword: str,
+                      country: str, doc_type: str, page: int) -> tuple:
+    """
+    One page of documents for the list view and the total match count.
+    Only that page crosses the network. Reruns with unchanged filters skip
+    the database; an upload/delete changes the corpus version and refetches.
+    """
+    return _fetch_document_page(
+        file_manager, user_id, user_role, keyword, country, doc_type, page,
+        current_corpus_version(file_manager)
+    )
+
+
+def get_search_indexes(chunks: list) -> tuple:
+    """Reuse the session's search indexes while the chunk list is unchanged."""
+    if st.session_state.get('search_index_chunks') is not chunks:
+        st.session_state.search_indexes = (VectorIndex(chunks), KeywordIndex(chunks))
+        st.session_state.search_index_chunks = chunks
+    return st.session_state.search_indexes
+
+# === BACKGROUND INGESTION ===
+@st.cache_resource
+def get_upload_executor() -> ProcessPoolExecutor:
+    """Process pool shared by all sessions for CPU-bound extraction/chunking."""
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def process_pending_upload(file_manager) -> None:
+    """Finish a background upload once its extraction job has completed."""
+    pending = st.session_state.get('pending_upload')
+    if not pending:
+        return
+
+    future = pending['future']
+    if not future.done():
+        st.sidebar.info(f"⏳ Processing {pending['filename']}...")
+        return
+
+    st.session_state.pending_upload = None
+    try:
+        text, chunks = future.result()
+        if not chunks:
+            st.sidebar.error("❌ Failed to extract meaningful text from file")
+            return
+
+        # Embed once at upload so queries only embed the question
+        with st.spinner("Indexing document..."):
+            try:
+                chunks = embed_chunks(chunks)
+            except Exception as e:
+                st.sidebar.warning(f"⚠️ Embedding skipped, keyword search will be used: {e}")
+
+        # Upload to Supabase (preview stored once instead of recomputed per render)
+        doc_id = file_manager.add_document(
+            pending['filename'], pending['country'], pending['doc_type'],
+            pending['owner_id'], pending['owner_role'], pending['file_content'], chunks,
+            preview=get_preview_text(chunks[0]['text'], 300)
+        )
+
+        if doc_id:
+            bump_corpus_version()
+            st.sidebar.success(f"✅ Uploaded! ID: {doc_id[:8]}...")
+            st.rerun()
+        else:
+            st.sidebar.error("❌ Upload failed - check error details above")
+
+    except Exception as e:
+        st.sidebar.error(f"❌ Upload error: {e}")
 
 # === AUTHENTICATION ===
 def login_user():
@@ -137,23 +413,19 @@ def main():
         initial_sidebar_state="expanded"
     )
 
-    # Optional font styling
-    st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Source+Sans+Pro:wght@400;600;700&display=swap');
-    </style>
-    """, unsafe_allow_html=True)
-
     # Initialize session state
     if 'file_manager' not in st.session_state:
         try:
-            st.session_state.file_manager = SupabaseManager()
+            st.session_state.file_manager = get_file_manager()
         except Exception as e:
             st.error(f"❌ Failed to initialize Supabase: {e}")
             st.stop()
             
     if 'qa_history' not in st.session_state:
-        st.session_state.qa_history = []
+        st.session_state.qa_history = deque(maxlen=QA_HISTORY_LIMIT)
+
+    if 'chunks_cache' not in st.session_state:
+        st.session_state.chunks_cache = {}
 
     # Login system
     login_user()
@@ -177,80 +449,90 @@ def main():
 
     # === UPLOAD SECTION ===
     st.sidebar.title("📤 Upload Document")
-    uploaded_file = st.sidebar.file_uploader("Choose a file", type=['pdf','docx','txt','png','jpg','jpeg'])
-    countries = ["Pakistan", "India", "USA", "UK", "Canada", "UAE"]
-    country = st.sidebar.selectbox("Select Country", countries)
-    doc_types = ["Ordinance","Act","Course Material","Student Material","Policy","Report","Other"]
-    doc_type = st.sidebar.selectbox("Document Type", doc_types)
+    uploaded_file = st.sidebar.file_uploader("Choose a file", type=UPLOAD_TYPES)
+    country = st.sidebar.selectbox("Select Country", COUNTRIES)
+    doc_type = st.sidebar.selectbox("Document Type", DOC_TYPES)
 
     if st.sidebar.button("Upload Document", type="primary"):
-        if uploaded_file is not None:
+        if st.session_state.get('pending_upload'):
+            st.sidebar.warning("Please wait for the current upload to finish")
+        elif uploaded_file is not None:
             try:
-                file_manager = st.session_state.file_manager
                 file_content = uploaded_file.getvalue()
                 if not file_content:
                     st.sidebar.error("❌ File is empty")
                     st.stop()
 
-                # Extract text
-                with st.spinner("Extracting text..."):
-                    text = extract_text(file_content, Path(uploaded_file.name).suffix)
-                
-                if not text or len(text.strip()) < 50:
-                    st.sidebar.error("❌ Failed to extract meaningful text from file")
-                else:
-                    # Chunk text
-                    with st.spinner("Processing document..."):
-                        chunks = chunk_text(text, str(uuid.uuid4()), 
-                                          chunk_size=800, overlap=100)
-                    
-                    # Upload to Supabase
-                    owner_role = "admin" if is_admin else "user"
-                    doc_id = file_manager.add_document(
-                        uploaded_file.name, country, doc_type,
-                        user_id, owner_role, file_content, chunks
-                    )
-                    
-                    if doc_id:
-                        st.sidebar.success(f"✅ Uploaded! ID: {doc_id[:8]}...")
-                        st.rerun()
-                    else:
-                        st.sidebar.error("❌ Upload failed - check error details above")
-                        
+                # Extract + chunk in a worker process so the UI stays responsive
+                future = get_upload_executor().submit(
+                    extract_and_chunk, file_content, Path(uploaded_file.name).suffix,
+                    str(uuid.uuid4()), 800, 100
+                )
+                st.session_state.pending_upload = {
+                    "future": future,
+                    "filename": uploaded_file.name,
+                    "country": country,
+                    "doc_type": doc_type,
+                    "owner_id": user_id,
+                    "owner_role": "admin" if is_admin else "user",
+                    "file_content": file_content,
+                }
             except Exception as e:
                 st.sidebar.error(f"❌ Upload error: {e}")
         else:
             st.sidebar.warning("Please select a file first")
 
+    process_pending_upload(st.session_state.file_manager)
+
     # === DOCUMENT LIST + SEARCH ===
     st.title("📄 Uploaded Documents")
     file_manager = st.session_state.file_manager
     search_keyword = st.text_input("Search Documents", placeholder="Enter keyword...")
-    filter_country = st.selectbox("Filter by Country", ["All"] + countries)
-    filter_type = st.selectbox("Filter by Type", ["All"] + doc_types)
+    filter_country = st.selectbox("Filter by Country", FILTER_COUNTRIES)
+    filter_type = st.selectbox("Filter by Type", FILTER_DOC_TYPES)
+
+    # Only one page is fetched and rendered; reset to the first page when filters change
+    filter_key = (search_keyword, filter_country, filter_type)
+    if st.session_state.get('doc_filter_key') != filter_key:
+        st.session_state.doc_filter_key = filter_key
+        st.session_state.doc_page = 0
+    page = st.session_state.get('doc_page', 0)
 
     try:
-        if search_keyword:
-            documents = file_manager.search_documents(user_id, user_role, search_keyword)
-        else:
-            documents = file_manager.get_documents_by_filters(
-                user_id, user_role, filter_country, filter_type
+        documents, total_documents = get_document_page(
+            file_manager, user_id, user_role, search_keyword, filter_country, filter_type, page
+        )
+        if not documents and page > 0 and total_documents:
+            # The corpus shrank under this page - show the last one instead
+            page = st.session_state.doc_page = (total_documents - 1) // DOCS_PER_PAGE
+            documents, total_documents = get_document_page(
+                file_manager, user_id, user_role, search_keyword, filter_country, filter_type, page
             )
     except Exception as e:
         st.error(f"❌ Error fetching documents: {e}")
-        documents = []
+        documents, total_documents = [], 0
 
     if not documents:
         st.info("No documents found. Upload some documents to get started!")
     else:
-        for idx, doc in enumerate(documents):
+        total_pages = (total_documents + DOCS_PER_PAGE - 1) // DOCS_PER_PAGE
+
+        if total_pages > 1:
+            col_prev, col_info, col_next = st.columns([1, 2, 1])
+            if col_prev.button("⬅️ Prev", disabled=page == 0):
+                st.session_state.doc_page = page - 1
+                st.rerun()
+            if col_next.button("Next ➡️", disabled=page >= total_pages - 1):
+                st.session_state.doc_page = page + 1
+                st.rerun()
+            col_info.caption(f"Page {page + 1} of {total_pages} ({total_documents} documents)")
+
+        for doc in documents:
             with st.expander(
                 f"{doc['filename']} ({doc['country']} - {doc['doc_type']})"
             ):
-                # Show preview
-                preview_text = doc.get('chunks', [{}])[0].get('text', '') if doc.get('chunks') else ''
-                preview = get_preview_text(preview_text, 300)
-                st.text_area("Preview", preview, height=100, key=f"preview_{idx}")
+                # Show preview (stored at upload; supabase_schema.sql backfills older rows)
+                st.text_area("Preview", doc.get('preview') or "", height=100, key=f"preview_{doc['id']}")
                 
                 # Show metadata
                 st.caption(
@@ -271,67 +553,87 @@ def main():
             st.warning("Please enter a question first")
         else:
             try:
-                with st.spinner("Searching documents and generating answer..."):
-                    all_chunks = file_manager.get_all_chunks(user_id, user_role)
+                with st.spinner("Searching documents..."):
+                    all_chunks = get_cached_chunks(file_manager, user_id, user_role)
                     
                     if not all_chunks:
                         st.warning("⚠️ No document chunks available. Upload documents first.")
                         st.stop()
                     
-                    relevant_chunks = find_relevant_chunks(question, all_chunks, top_k=5)
+                    # Near-duplicate questions reuse a cached answer, across sessions
+                    cache_scope = qa_cache_scope(file_manager, user_id, user_role, selected_model)
+                    try:
+                        question_embedding = embed_query(question)
+                    except Exception:
+                        question_embedding = None
                     
-                    if not relevant_chunks:
-                        st.info("ℹ️ No relevant document sections found. Will use general knowledge.")
+                    result = None
+                    if question_embedding is not None:
+                        result = get_qa_cache().lookup(cache_scope, question_embedding)
                     
-                    result = get_answer_from_chunks(
-                        query=question, chunks=relevant_chunks, model=selected_model
-                    )
+                    if result is None:
+                        vector_index, keyword_index = get_search_indexes(all_chunks)
+                        relevant_chunks = find_semantic_chunks(
+                            question, all_chunks, top_k=CONTEXT_CHUNKS,
+                            index=vector_index,
+                            query_vector=question_embedding,
+                            keyword_index=keyword_index
+                        )
+                        
+                        if not relevant_chunks:
+                            st.info("ℹ️ No relevant document sections found. Will use general knowledge.")
 
                 st.markdown("#### 🤖 AI Answer")
-                st.markdown(result['answer'])
+                if result is None:
+                    # Render tokens as Gemini streams them instead of waiting for the full answer
+                    stream = AnswerStream(question, relevant_chunks, selected_model)
+                    placeholder = st.empty()
+                    streamed_text = ""
+                    for piece in stream:
+                        streamed_text += piece
+                        placeholder.markdown(streamed_text + "▌")
+                    result = stream.result
+                    placeholder.markdown(result['answer'])
+                    
+                    if question_embedding is not None and not result.get('error'):
+                        get_qa_cache().add(cache_scope, question_embedding, result)
+                else:
+                    st.markdown(result['answer'])
                 
                 # Store in history
                 st.session_state.qa_history.append({
                     "question": question,
                     "answer": result['answer'],
-                    "model": selected_model,
+                    "model": result.get('model_used') or selected_model,
                     "timestamp": datetime.now().isoformat()
                 })
                 
-                # ===== DOWNLOAD BUTTONS (NEW) =====
-                st.markdown("---")
-                st.markdown("#### 💾 Download Response")
-                
-                # Prepare export data
+                # Prepare export data; the fixed timestamp keeps the export cache key stable
                 export_data = {
                     "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "model": selected_model,
+                    "model": result.get('model_used') or selected_model,
                     "question": question,
                     "answer": result['answer'],
                     "sources": result.get('sources', []),
-                    "has_document_context": len(relevant_chunks) > 0,
+                    "has_document_context": result.get('has_document_context', False),
                     "used_general_knowledge": result.get('used_general_knowledge', False)
                 }
-                
-                col1, col2 = st.columns(2)
-                with col1:
-                    pdf_data = create_pdf_export(export_data)
-                    st.download_button(
-                        label="📄 Download PDF",
-                        data=pdf_data,
-                        file_name=f"ai_answer_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                        mime="application/pdf"
-                    )
-                with col2:
-                    docx_data = create_docx_export(export_data)
-                    st.download_button(
-                        label="📝 Download DOCX",
-                        data=docx_data,
-                        file_name=f"ai_answer_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx",
-                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    )
+                st.session_state.last_answer = export_data
+                render_downloads(export_data)
 
             except Exception as e:
                 st.error(f"❌ Error generating answer: {e}")
                 st.info("💡 Tip: Check that documents are properly uploaded and chunked")
 
+    elif st.session_state.get('last_answer'):
+        # Reruns (download clicks, upload polling) keep showing the last answer
+        last_answer = st.session_state.last_answer
+        st.markdown("#### 🤖 AI Answer")
+        st.markdown(last_answer['answer'])
+        render_downloads(last_answer)
+
+    # Poll the background upload until its result can be stored
+    if st.session_state.get('pending_upload'):
+        time.sleep(0.5)
+        st.rerun()
+
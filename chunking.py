@@ -1,107 +1,202 @@
 # chunking.py - Semantic chunking with overlap
-from typing import List, Dict
+import re
+from collections import Counter, defaultdict, deque
+from typing import List, Dict, Iterator, Optional, Tuple
+import numpy as np
+
+# Paragraph boundary: a blank line, which may contain stray whitespace
+PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n")
+
+def iter_paragraphs(text: str) -> Iterator[str]:
+    """Yield paragraphs lazily instead of materializing a split() list."""
+    start = 0
+    for match in PARAGRAPH_BREAK_RE.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    yield text[start:]
 
 def chunk_text(text: str, doc_id: str, chunk_size: int = 1000, overlap: int = 200) -> List[Dict]:
     """
     Split text into overlapping chunks that preserve context.
+    Paragraphs are buffered in a deque and joined once per chunk, and the
+    overlap carries whole trailing paragraphs into the next chunk.
     """
-    if not text or len(text.strip()) == 0:
+    if not text or text.isspace():
         return []
     
-    # Pre-process: Clean text and preserve paragraphs
-    paragraphs = text.split('\n\n')
     chunks = []
-    chunk_index = 0
-    current_chunk = ""
+    buf = deque()  # paragraphs of the chunk being built
+    buf_len = 0    # len("\n\n".join(buf)), kept without re-joining
+    
+    def emit():
+        # Paragraphs are stripped on the way in
+        chunk_body = "\n\n".join(buf)
+        chunk_index = len(chunks)
+        chunks.append({
+            'chunk_id': f"{doc_id}_chunk_{chunk_index}",
+            'doc_id': doc_id,
+            'text': chunk_body,
+            'chunk_index': chunk_index,
+            'preview': chunk_body[:100]
+        })
+        return chunk_body
     
-    for para in paragraphs:
+    for para in iter_paragraphs(text):
         para = para.strip()
         if not para:
             continue
         
         # If adding this paragraph would exceed chunk size, save current chunk
-        if len(current_chunk) + len(para) > chunk_size and current_chunk:
-            chunks.append({
-                'chunk_id': f"{doc_id}_chunk_{chunk_index}",
-                'doc_id': doc_id,
-                'text': current_chunk.strip(),
-                'chunk_index': chunk_index,
-                'preview': current_chunk[:100].strip()
-            })
-            chunk_index += 1
+        if buf and buf_len + len(para) > chunk_size:
+            chunk_body = emit()
             
-            # Start new chunk with overlap from previous
-            current_chunk = current_chunk[-overlap:] + "\n\n" + para
-        else:
-            current_chunk += "\n\n" + para if current_chunk else para
+            # Start new chunk with overlap: the fewest trailing paragraphs
+            # whose cumulative length reaches it
+            while len(buf) > 1 and buf_len - len(buf[0]) - 2 >= overlap:
+                buf_len -= len(buf.popleft()) + 2
+            if overlap <= 0:
+                buf.clear()
+                buf_len = 0
+            elif len(buf) == 1 and buf_len > overlap:
+                # Last paragraph alone is longer than the overlap - take its tail
+                tail = chunk_body[-overlap:].lstrip()
+                buf[0] = tail
+                buf_len = len(tail)
+        
+        buf_len += len(para) + (2 if buf else 0)
+        buf.append(para)
     
     # Add final chunk
-    if current_chunk.strip():
-        chunks.append({
-            'chunk_id': f"{doc_id}_chunk_{chunk_index}",
-            'doc_id': doc_id,
-            'text': current_chunk.strip(),
-            'chunk_index': chunk_index,
-            'preview': current_chunk[:100].strip()
-        })
+    if buf:
+        emit()
     
     return chunks
 
-def find_relevant_chunks(query: str, chunks: List[Dict], top_k: int = 5) -> List[Dict]:
+# BM25 parameters (Okapi defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+# Heading words are found in one scan per chunk rather than one per word
+HEADING_RE = re.compile(r"section|chapter")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens (Unicode-aware, so Urdu/Arabic terms survive)."""
+    return TOKEN_RE.findall(text.lower())
+
+# Variations for common legal terms (transliterations, Urdu/Arabic, English)
+LEGAL_TERM_VARIATIONS = (
+    ("qatal", "قتل", "killing", "murder"),
+    ("amad", "amd", "عمد", "intentional"),
+    ("shibh", "شبه", "near", "manslaughter"),
+    ("diat", "diyat", "دیت", "blood", "money"),
+)
+
+# Every variation maps to its whole group, so expansion is a dict lookup
+SYNONYMS = {term: group for group in LEGAL_TERM_VARIATIONS for term in group}
+
+class KeywordIndex:
     """
-    Smart search that handles partial matches and Urdu/Arabic transliterations.
+    BM25 inverted index over a chunk set, built once per corpus.
+    Each term maps to the chunks containing it and their precomputed
+    BM25 weights, so a query only touches postings for its own terms.
+    Adjacent-token bigrams are indexed too, for the exact phrase bonus.
     """
-    query_lower = query.lower()
+    def __init__(self, chunks: List[Dict]):
+        self.chunks = chunks
+        n_docs = len(chunks)
+        # Title/heading bonus does not depend on the query
+        self.heading_bonus = np.zeros(n_docs, dtype=np.float32)
+        
+        term_docs = defaultdict(list)
+        bigram_docs = defaultdict(list)
+        doc_lengths = np.zeros(n_docs, dtype=np.float32)
+        for i, chunk in enumerate(chunks):
+            text = chunk['text'].lower()
+            if HEADING_RE.search(text):
+                self.heading_bonus[i] = 2
+            
+            tokens = TOKEN_RE.findall(text)
+            doc_lengths[i] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_docs[term].append((i, tf))
+            for bigram in set(zip(tokens, tokens[1:])):
+                bigram_docs[" ".join(bigram)].append(i)
+        
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / (avg_length or 1.0))
+        
+        self.postings = {}
+        for term, entries in term_docs.items():
+            docs = np.fromiter((i for i, _ in entries), dtype=np.int32, count=len(entries))
+            tfs = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=len(entries))
+            idf = np.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            self.postings[term] = (docs, idf * tfs * (BM25_K1 + 1) / (tfs + norm[docs]))
+        
+        self.phrase_postings = {
+            bigram: np.asarray(docs, dtype=np.int32) for bigram, docs in bigram_docs.items()
+        }
     
+    def score_candidates(self, terms, phrases=()) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Chunks containing at least one term, and their scores:
+        BM25 over the terms, +10 per matching phrase, plus the heading bonus.
+        Chunks with no query term are never scored.
+        """
+        postings = [self.postings[term] for term in terms if term in self.postings]
+        if not postings:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+        
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        for docs, weights in postings:
+            scores[docs] += weights
+        for phrase in phrases:
+            docs = self.phrase_postings.get(phrase)
+            if docs is not None:
+                scores[docs] += 10
+        
+        candidates = np.unique(np.concatenate([docs for docs, _ in postings]))
+        return candidates, scores[candidates] + self.heading_bonus[candidates]
+
+def rank_chunks(query: str, index: KeywordIndex, top_k: int = 5) -> List[Dict]:
+    """
+    Keyword-ranked chunks for a query, best first; empty if nothing matches.
+    Handles partial matches and Urdu/Arabic transliterations.
+    """
     # Normalize query for flexible matching
     # Handle common variations like "qatal e amad", "qatal-e-amd", "قتل"
-    query_terms = query_lower.split()
+    query_terms = tokenize(query)
     
-    # Add variations for common legal terms
-    variations = {
-        "qatal": ["qatal", "قتل", "killing", "murder"],
-        "amad": ["amad", "amd", "عمد", "intentional"],
-        "shibh": ["shibh", "شبه", "near", "manslaughter"],
-        "diat": ["diat", "diyat", "دیت", "blood", "money"],
-    }
+    # Expand common legal terms with one synonym lookup per token
+    expanded_terms = list(dict.fromkeys(
+        term for token in query_terms for term in SYNONYMS.get(token, (token,))
+    ))
     
-    expanded_terms = []
-    for term in query_terms:
-        expanded_terms.append(term)
-        for key, vals in variations.items():
-            if term in vals:
-                expanded_terms.extend(vals)
+    # Phrases come from the query as typed, not from the expanded synonyms
+    phrases = [" ".join(query_terms[i:i+2]) for i in range(len(query_terms) - 1)]
     
-    # Score chunks
-    scored_chunks = []
-    for chunk in chunks:
-        score = 0
-        chunk_text_lower = chunk['text'].lower()
-        
-        # Exact phrase match (highest score)
-        for i in range(len(expanded_terms) - 1):
-            phrase = " ".join(expanded_terms[i:i+2])
-            if phrase in chunk_text_lower:
-                score += 10
-        
-        # Individual term matches
-        for term in set(expanded_terms):
-            if term in chunk_text_lower:
-                score += 1
-        
-        # Title/heading matches (bonus)
-        if "section" in chunk_text_lower or "chapter" in chunk_text_lower:
-            score += 2
-        
-        if score > 0:
-            scored_chunks.append((chunk, score))
+    # Exact phrase matches score highest; all scoring runs on NumPy arrays
+    candidates, scores = index.score_candidates(expanded_terms, phrases)
+    if not len(candidates):
+        return []
     
-    # Sort and return top_k
-    scored_chunks.sort(key=lambda x: x[1], reverse=True)
+    k = min(top_k, len(candidates))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [index.chunks[i] for i in candidates[top]]
+
+def find_relevant_chunks(query: str, chunks: List[Dict], top_k: int = 5,
+                         index: Optional[KeywordIndex] = None) -> List[Dict]:
+    """
+    Smart search that handles partial matches and Urdu/Arabic transliterations.
+    """
+    if index is None:
+        index = KeywordIndex(chunks)
     
     # If we found matches, return them
-    if scored_chunks:
-        return [chunk for chunk, score in scored_chunks[:top_k]]
+    ranked = rank_chunks(query, index, top_k)
+    if ranked:
+        return ranked
     
     # No matches - return first few chunks as fallback
-    return chunks[:3]
\ No newline at end of file
+    return chunks[:3]
@@ -0,0 +1,66 @@
+# clients.py - Shared API clients, built once per Streamlit server process
+import os
+from typing import Optional
+import streamlit as st
+import google.generativeai as genai
+from dotenv import load_dotenv
+from supabase_client import SupabaseManager
+
+# === GEMINI ===
+def initialize_gemini_client():
+    """Initialize Gemini with robust error handling."""
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    
+    if not api_key:
+        try:
+            api_key = st.secrets["GOOGLE_API_KEY"]
+        except:
+            pass
+    
+    if not api_key:
+        st.error("""
+        ### 🔴 NO API KEY FOUND
+        
+        **Get your FREE key from:** https://aistudio.google.com/app/apikey 
+        
+        **Then create `.env` file with:**
+        ```
+        GEMINI_API_KEY=AIzaSyYourKeyHere
+        ```
+        """)
+        st.stop()
+    
+    if not api_key.startswith("AIza"):
+        st.error("❌ Invalid key format. Must start with 'AIza...'")
+        st.stop()
+    
+    genai.configure(api_key=api_key)
+    return genai
+
+# === LAZY LOADING WITH CACHING ===
+@st.cache_resource
+def get_gemini_client():
+    """Initialize Gemini only once per session - prevents startup timeout"""
+    try:
+        client = initialize_gemini_client()
+        st.sidebar.success("✅ Gemini API connected")
+        return client
+    except Exception as e:
+        st.sidebar.error(f"❌ Gemini init failed: {e}")
+        st.sidebar.info("Check your API key in Streamlit Cloud Secrets")
+        return None
+
+@st.cache_resource
+def get_gemini_model(name: str) -> Optional[genai.GenerativeModel]:
+    """One GenerativeModel per model name, reused by every question."""
+    client = get_gemini_client()
+    if client is None:
+        return None
+    return client.GenerativeModel(name)
+
+# === SUPABASE ===
+@st.cache_resource
+def get_file_manager() -> SupabaseManager:
+    """One Supabase client (and bucket check) shared by every session."""
+    return SupabaseManager()
@@ -1,8 +1,34 @@
 # comprehensive_test.py - Run this to verify everything
+import hashlib
 import os
+import sys
+import time
+from pathlib import Path
+import orjson
 from dotenv import load_dotenv
 import google.generativeai as genai
 
+# Model list from the last successful check; pass --force to re-query
+MODELS_CACHE = Path.home() / ".cache" / "lawmate" / "gemini_models.json"
+MODELS_CACHE_TTL = 24 * 60 * 60
+
+def load_cached_models(key_hash):
+    """Cached model names for this key, or None if missing or stale."""
+    try:
+        if time.time() - MODELS_CACHE.stat().st_mtime > MODELS_CACHE_TTL:
+            return None
+        cached = orjson.loads(MODELS_CACHE.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    return cached["models"] if cached.get("key") == key_hash else None
+
+def save_cached_models(key_hash, names):
+    try:
+        MODELS_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        MODELS_CACHE.write_bytes(orjson.dumps({"key": key_hash, "models": names}))
+    except OSError:
+        pass  # Cache is optional
+
 print("="*60)
 print("🔍 COMPREHENSIVE GEMINI API TEST")
 print("="*60)
@@ -20,15 +46,23 @@ if api_key:
 if api_key:
     print("\n2. Testing Gemini API connectivity...")
     try:
-        genai.configure(api_key=api_key)
-        models = genai.list_models()
-        print("   ✅ API KEY IS VALID!")
+        # Only a hash of the key is cached, so a new key is always re-checked
+        key_hash = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        names = None if "--force" in sys.argv else load_cached_models(key_hash)
+        if names is not None:
+            print("   ✅ API KEY IS VALID! (cached result - run with --force to re-check)")
+        else:
+            genai.configure(api_key=api_key)
+            # list_models() is lazy; the request happens while iterating
+            names = [model.name for model in genai.list_models()
+                     if 'generateContent' in model.supported_generation_methods]
+            save_cached_models(key_hash, names)
+            print("   ✅ API KEY IS VALID!")
         
         # Show available models
         print("\n3. Available models:")
-        for model in models:
-            if 'generateContent' in model.supported_generation_methods:
-                print(f"   - {model.name}")
+        for name in names:
+            print(f"   - {name}")
         
         print("\n" + "="*60)
         print("🎉 SUCCESS! Your key is working correctly.")
@@ -1,20 +1,325 @@
 # database.py - Complete with authentication & access control
+import queue
 import sqlite3
-import json
-from datetime import datetime
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import uuid
+import orjson
+import zstandard as zstd
+from passwords import LEGACY_PLAINTEXT, check_password, hash_password, needs_rehash
+
+# zstd frame header - rows stored before compression lack it
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+def compress_blob(data: bytes) -> bytes:
+    """Compress file content for storage."""
+    return zstd.ZstdCompressor(level=3).compress(data)
+
+# Chunks live in their own table, one row per chunk; fields other than
+# chunk_id/text (doc_id, chunk_index, preview, embedding...) go in meta
+# as orjson bytes, stored without a decode/encode round-trip
+CHUNKS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS chunks (
+        doc_id TEXT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+        ord INTEGER NOT NULL,
+        chunk_id TEXT NOT NULL,
+        text TEXT NOT NULL,
+        meta BLOB NOT NULL,
+        PRIMARY KEY (doc_id, ord)
+    )
+"""
+CHUNK_COLUMNS = "c.chunk_id, c.text, c.meta"
+
+def insert_chunks(conn: sqlite3.Connection, doc_id: str, chunks: List[Dict]) -> None:
+    """Insert a document's chunks as rows in one executemany call."""
+    conn.executemany(
+        "INSERT INTO chunks (doc_id, ord, chunk_id, text, meta) VALUES (?, ?, ?, ?, ?)",
+        (
+            (doc_id, i, chunk.get('chunk_id', f"{doc_id}_chunk_{i}"), chunk['text'],
+             orjson.dumps({k: v for k, v in chunk.items() if k not in ('chunk_id', 'text')}))
+            for i, chunk in enumerate(chunks)
+        )
+    )
+
+def row_to_chunk(chunk_id: str, text: str, meta: bytes) -> Dict:
+    """Rebuild a chunk dict from its CHUNK_COLUMNS."""
+    chunk = orjson.loads(meta)
+    chunk['chunk_id'] = chunk_id
+    chunk['text'] = text
+    return chunk
+
+def create_chunks_table(conn: sqlite3.Connection) -> None:
+    """Create the chunks table, moving chunks out of legacy JSON columns."""
+    conn.execute(CHUNKS_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if 'chunks' in columns:
+        for doc_id, chunks_json in conn.execute("SELECT id, chunks FROM documents").fetchall():
+            insert_chunks(conn, doc_id, orjson.loads(chunks_json))
+        conn.execute("ALTER TABLE documents DROP COLUMN chunks")
+
+# Full-text index over chunk text, kept in sync with chunks by triggers.
+# External content: the text itself is stored only once, in chunks.
+# No porter stemmer: it stems prefix queries too ("diy" -> "dii"), which
+# breaks the partial-word matching search_documents relies on.
+CHUNKS_FTS_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        text, content='chunks', content_rowid='rowid',
+        tokenize='unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts (rowid, text) VALUES (new.rowid, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE ON chunks BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+        INSERT INTO chunks_fts (rowid, text) VALUES (new.rowid, new.text);
+    END""",
+)
+
+def create_chunks_fts(conn: sqlite3.Connection) -> None:
+    """Create the chunk full-text index, indexing existing chunks once."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+    ).fetchone()
+    for statement in CHUNKS_FTS_SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+
+def fts_query(keyword: str) -> str:
+    """
+    FTS5 MATCH expression for a search box keyword: every word must
+    appear, each as a quoted prefix so partial words still match.
+    """
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in keyword.split())
+
+def search_clause(keyword: str) -> Tuple[str, List[str]]:
+    """WHERE fragment (and its params) matching a keyword in filename or chunk text."""
+    clause = "filename LIKE ?"
+    params = [f"%{keyword}%"]
+    match = fts_query(keyword)
+    if match:
+        clause += """ OR id IN (
+            SELECT c.doc_id FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid
+            WHERE chunks_fts MATCH ?
+        )"""
+        params.append(match)
+    return f"({clause})", params
+
+# Original file bytes live out of the documents row, so metadata scans
+# never page them in
+BLOBS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS document_blobs (
+        doc_id TEXT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+        content BLOB NOT NULL
+    )
+"""
+BLOB_READ_SIZE = 1 << 16
+
+def create_blobs_table(conn: sqlite3.Connection) -> None:
+    """Create document_blobs, moving content out of legacy file_content columns."""
+    conn.execute(BLOBS_SCHEMA)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if 'file_content' in columns:
+        conn.execute("INSERT INTO document_blobs (doc_id, content) SELECT id, file_content FROM documents")
+        conn.execute("ALTER TABLE documents DROP COLUMN file_content")
+
+def read_blob(conn: sqlite3.Connection, doc_id: str) -> Optional[bytes]:
+    """
+    Read and decompress a document's content with incremental BLOB I/O,
+    so the compressed copy is never held in memory as a whole.
+    """
+    row = conn.execute("SELECT rowid FROM document_blobs WHERE doc_id = ?", (doc_id,)).fetchone()
+    if row is None:
+        return None
+    
+    with conn.blobopen("document_blobs", "content", row[0], readonly=True) as blob:
+        head = blob.read(BLOB_READ_SIZE)
+        if head[:4] != _ZSTD_MAGIC:
+            # Legacy raw rows were stored uncompressed
+            return head + blob.read()
+        decompressor = zstd.ZstdDecompressor().decompressobj()
+        parts = [decompressor.decompress(head)]
+        while piece := blob.read(BLOB_READ_SIZE):
+            parts.append(decompressor.decompress(piece))
+    return b"".join(parts)
+
+def add_updated_at_column(conn: sqlite3.Connection) -> None:
+    """Give legacy documents tables the updated_at column used as cache version."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+    if 'updated_at' not in columns:
+        conn.execute("ALTER TABLE documents ADD COLUMN updated_at TEXT")
+        conn.execute("UPDATE documents SET updated_at = upload_date")
+
+class ChunkCache:
+    """
+    Parsed chunk lists keyed by doc_id and stamped with the row's
+    updated_at, so retrieval skips re-reading unchanged documents.
+    """
+    def __init__(self):
+        self._entries: Dict[str, Tuple[str, List[Dict]]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, conn: sqlite3.Connection, doc_id: str, updated_at: str) -> List[Dict]:
+        with self._lock:
+            entry = self._entries.get(doc_id)
+        if entry is not None and entry[0] == updated_at:
+            return entry[1]
+        
+        rows = conn.execute(
+            f"SELECT {CHUNK_COLUMNS} FROM chunks c WHERE c.doc_id = ? ORDER BY c.ord",
+            (doc_id,)
+        ).fetchall()
+        chunks = [row_to_chunk(*row) for row in rows]
+        with self._lock:
+            self._entries[doc_id] = (updated_at, chunks)
+        return chunks
+    
+    def invalidate(self, doc_id: str) -> None:
+        with self._lock:
+            self._entries.pop(doc_id, None)
+
+# Passwords are stored as "scrypt$<salt>$<key>" (hex); anything else is a
+# legacy plaintext row, upgraded on the next successful login
+def authenticate(conn: sqlite3.Connection, username: str, password: str) -> Optional[Dict]:
+    """Look a user up by username and check the password in Python."""
+    row = conn.execute(
+        "SELECT user_id, username, role, password FROM users WHERE username = ?",
+        (username,)
+    ).fetchone()
+    if row is None or not check_password(password, row[3], LEGACY_PLAINTEXT):
+        return None
+    if needs_rehash(row[3]):
+        conn.execute(
+            "UPDATE users SET password = ? WHERE user_id = ?",
+            (hash_password(password), row[0])
+        )
+    return {"user_id": row[0], "username": row[1], "role": row[2]}
+
+# Listing/search return metadata only; content and chunks are loaded on demand
+# Timestamps are stamped by SQLite: local ISO-8601, ordered like the
+# datetime.now().isoformat() values in older rows
+NOW_SQL = "strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime')"
+
+DOCUMENT_META_FIELDS = ("id", "filename", "country", "doc_type", "upload_date", "owner_id", "owner_role")
+DOCUMENT_META_COLUMNS = ", ".join(DOCUMENT_META_FIELDS)
+
+def meta_dicts(rows) -> List[Dict]:
+    """Plain tuple rows of DOCUMENT_META_COLUMNS as dicts, without sqlite3.Row."""
+    return [dict(zip(DOCUMENT_META_FIELDS, row)) for row in rows]
+
+# Access control: admin sees all, users see admin docs + their own.
+# Bind (user_role, user_id).
+ACL_CLAUSE = "(? = 'admin' OR owner_role = 'admin' OR owner_id = ?)"
+
+DOCUMENT_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_docs_owner_date ON documents(owner_role, owner_id, upload_date DESC)",
+    "CREATE INDEX IF NOT EXISTS idx_docs_country_type ON documents(country, doc_type)",
+)
+
+# Larger pages mean fewer page reads per BLOB; page_size must precede
+# the switch to WAL to take effect on a new database
+PAGE_SIZE = 16384
+
+# Applied to every pooled connection when it is opened
+SQLITE_PRAGMAS = (
+    f"PRAGMA page_size={PAGE_SIZE}",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=1073741824",
+    # Off by default per connection; chunks and blobs cascade from documents
+    "PRAGMA foreign_keys=ON",
+)
+POOL_SIZE = 4
+
+def upgrade_page_size(conn: sqlite3.Connection) -> None:
+    """
+    Rebuild an existing database at PAGE_SIZE, once. WAL databases keep
+    their page size through VACUUM, so leave WAL for the rebuild.
+    """
+    if conn.execute("PRAGMA page_size").fetchone()[0] >= PAGE_SIZE:
+        return
+    try:
+        conn.execute("PRAGMA journal_mode=DELETE")
+    except sqlite3.OperationalError:
+        return  # Another connection has the database open; retry next start
+    conn.execute(f"PRAGMA page_size={PAGE_SIZE}")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA journal_mode=WAL")
+    # VACUUM may renumber chunk rowids, which chunks_fts refers to
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'").fetchone():
+        conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+
+class ConnectionPool:
+    """
+    Reusable SQLite connections, each checked out by one caller at a time.
+    Keeps SQLite's page and statement caches warm between queries.
+    """
+    def __init__(self, db_path: str, max_connections: int = POOL_SIZE):
+        self.db_path = db_path
+        if db_path == ":memory:":
+            # Every new connection would open its own empty database
+            max_connections = 1
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    @contextmanager
+    def connection(self):
+        """Check out a connection; commits on success, rolls back on error."""
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                self._idle.put(conn)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Check out a connection inside BEGIN IMMEDIATE ... COMMIT.
+        Takes the write lock up front, so multi-statement writes commit
+        (and sync) once and never fail upgrading a read lock mid-way.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+# Database files whose schema this process has already set up
+_initialized_paths = set()
+_init_lock = threading.Lock()
 
 class DocumentDatabase:
     def __init__(self, db_path: str = "/tmp/documents.db"):
         """Initialize SQLite database connection."""
         self.db_path = db_path
-        self.init_database()
+        self.pool = ConnectionPool(db_path)
+        self.chunk_cache = ChunkCache()
+        with _init_lock:
+            # Every ":memory:" instance is a fresh, empty database
+            if db_path == ":memory:" or db_path not in _initialized_paths:
+                self.init_database()
+                _initialized_paths.add(db_path)
     
     def init_database(self):
         """Create tables if they don't exist."""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
+            upgrade_page_size(conn)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS documents (
                     id TEXT PRIMARY KEY,
@@ -24,10 +329,13 @@ class DocumentDatabase:
                     upload_date TEXT NOT NULL,
                     owner_id TEXT NOT NULL,
                     owner_role TEXT NOT NULL,
-                    file_content BLOB NOT NULL,
-                    chunks TEXT NOT NULL
+                    updated_at TEXT
                 )
             """)
+            add_updated_at_column(conn)
+            create_chunks_table(conn)
+            create_chunks_fts(conn)
+            create_blobs_table(conn)
             
             # Create users table for authentication
             conn.execute("""
@@ -39,146 +347,143 @@ class DocumentDatabase:
                 )
             """)
             
-            # Create default admin user if not exists
-            cursor = conn.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
-            if cursor.fetchone()[0] == 0:
-                conn.execute(
-                    "INSERT INTO users VALUES (?, ?, ?, ?)",
-                    ("admin_001", "admin", "admin123", "admin")
-                )
+            for statement in DOCUMENT_INDEXES:
+                conn.execute(statement)
+            
+            # Create default admin user if not exists (one idempotent statement)
+            conn.execute(
+                """INSERT OR IGNORE INTO users (user_id, username, password, role)
+                   SELECT ?, ?, ?, ?
+                   WHERE NOT EXISTS (SELECT 1 FROM users WHERE role = 'admin')""",
+                ("admin_001", "admin", hash_password("admin123"), "admin")
+            )
             
             conn.commit()
     
     def add_document(self, filename: str, country: str, doc_type: str, 
                      owner_id: str, owner_role: str, file_content: bytes, 
-                     chunks: List[Dict]) -> str:
+                     chunks: List[Dict], doc_id: Optional[str] = None) -> str:
         """Add a document to the database."""
-        doc_id = str(uuid.uuid4())
-        upload_date = datetime.now().isoformat()
+        doc_id = doc_id or str(uuid.uuid4())
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.transaction() as conn:
+            # 'now' is fixed for the statement, so both stamps are equal
             conn.execute(
-                """INSERT INTO documents 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (doc_id, filename, country, doc_type, upload_date, 
-                 owner_id, owner_role, file_content, json.dumps(chunks))
+                f"""INSERT INTO documents 
+                   (id, filename, country, doc_type, upload_date,
+                    owner_id, owner_role, updated_at)
+                   VALUES (?, ?, ?, ?, {NOW_SQL}, ?, ?, {NOW_SQL})""",
+                (doc_id, filename, country, doc_type, owner_id, owner_role)
             )
-            conn.commit()
+            conn.execute(
+                "INSERT INTO document_blobs (doc_id, content) VALUES (?, ?)",
+                (doc_id, compress_blob(file_content))
+            )
+            insert_chunks(conn, doc_id, chunks)
         return doc_id
     
     def get_all_documents(self, user_id: str, user_role: str) -> List[Dict]:
         """Retrieve all documents with access control."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute("SELECT * FROM documents ORDER BY upload_date DESC")
-            documents = []
-            for row in cursor.fetchall():
-                doc = dict(row)
-                doc['chunks'] = json.loads(doc['chunks'])
-                
-                # Access control: admin sees all, users see admin docs + their own
-                if user_role == "admin" or doc['owner_role'] == "admin" or doc['owner_id'] == user_id:
-                    documents.append(doc)
-            
-        return documents
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                f"""SELECT {DOCUMENT_META_COLUMNS} FROM documents
+                    WHERE {ACL_CLAUSE}
+                    ORDER BY upload_date DESC""",
+                (user_role, user_id)
+            )
+            return meta_dicts(cursor)
     
     def get_documents_by_filters(self, user_id: str, user_role: str,
                                  country: Optional[str] = None, 
                                  doc_type: Optional[str] = None) -> List[Dict]:
         """Filter documents with access control."""
-        query = "SELECT * FROM documents WHERE 1=1"
-        params = []
-        
-        if country and country != "All":
-            query += " AND country = ?"
-            params.append(country)
-        
-        if doc_type and doc_type != "All":
-            query += " AND doc_type = ?"
-            params.append(doc_type)
-        
-        query += " ORDER BY upload_date DESC"
+        # None (or "All") disables a filter; one statement covers every combination
+        country = country if country and country != "All" else None
+        doc_type = doc_type if doc_type and doc_type != "All" else None
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(query, params)
-            documents = []
-            for row in cursor.fetchall():
-                doc = dict(row)
-                doc['chunks'] = json.loads(doc['chunks'])
-                
-                # Access control
-                if user_role == "admin" or doc['owner_role'] == "admin" or doc['owner_id'] == user_id:
-                    documents.append(doc)
-                    
-        return documents
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                f"""SELECT {DOCUMENT_META_COLUMNS} FROM documents
+                    WHERE {ACL_CLAUSE}
+                      AND (? IS NULL OR country = ?)
+                      AND (? IS NULL OR doc_type = ?)
+                    ORDER BY upload_date DESC""",
+                (user_role, user_id, country, country, doc_type, doc_type)
+            )
+            return meta_dicts(cursor)
     
     def search_documents(self, user_id: str, user_role: str, keyword: str) -> List[Dict]:
-        """Search documents by keyword with access control."""
-        search_term = f"%{keyword.lower()}%"
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
+        """Search documents by keyword with access control (filename substring or full-text match)."""
+        clause, params = search_clause(keyword)
+        with self.pool.connection() as conn:
             cursor = conn.execute(
-                """SELECT * FROM documents 
-                   WHERE (LOWER(filename) LIKE ? OR LOWER(chunks) LIKE ?)
-                   ORDER BY upload_date DESC""",
-                (search_term, search_term)
+                f"""SELECT {DOCUMENT_META_COLUMNS} FROM documents 
+                    WHERE {ACL_CLAUSE} AND {clause}
+                    ORDER BY upload_date DESC""",
+                (user_role, user_id, *params)
             )
-            documents = []
-            for row in cursor.fetchall():
-                doc = dict(row)
-                doc['chunks'] = json.loads(doc['chunks'])
-                
-                # Access control
-                if user_role == "admin" or doc['owner_role'] == "admin" or doc['owner_id'] == user_id:
-                    documents.append(doc)
-                    
-        return documents
+            return meta_dicts(cursor)
+    
+    def get_document_content(self, doc_id: str) -> Optional[bytes]:
+        """Load one document's original file bytes."""
+        with self.pool.connection() as conn:
+            return read_blob(conn, doc_id)
     
     def delete_document(self, doc_id: str, user_id: str, user_role: str) -> bool:
         """Delete document (admin only)."""
         if user_role != "admin":
             return False
             
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
             conn.commit()
-            return cursor.rowcount > 0
+        self.chunk_cache.invalidate(doc_id)
+        return cursor.rowcount > 0
     
     def get_all_chunks(self, user_id: str, user_role: str) -> List[Dict]:
         """Get all chunks with access control."""
-        chunks = []
-        docs = self.get_all_documents(user_id, user_role)
-        for doc in docs:
-            for chunk in doc.get('chunks', []):
-                chunk_with_meta = chunk.copy()
-                chunk_with_meta.update({
-                    'filename': doc['filename'],
-                    'country': doc['country'],
-                    'doc_type': doc['doc_type']
-                })
-                chunks.append(chunk_with_meta)
+        with self.pool.connection() as conn:
+            docs = conn.execute(
+                f"""SELECT id, filename, country, doc_type, updated_at FROM documents
+                    WHERE {ACL_CLAUSE}
+                    ORDER BY upload_date DESC""",
+                (user_role, user_id)
+            ).fetchall()
+            
+            chunks = []
+            for doc_id, filename, country, doc_type, updated_at in docs:
+                # Copies, so callers can't modify the cached chunks
+                for chunk in self.chunk_cache.get(conn, doc_id, updated_at):
+                    chunks.append({
+                        **chunk,
+                        'filename': filename,
+                        'country': country,
+                        'doc_type': doc_type
+                    })
         return chunks
     
+    def get_chunks_for_doc(self, doc_id: str) -> List[Dict]:
+        """Get one document's chunks in order."""
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {CHUNK_COLUMNS} FROM chunks c WHERE c.doc_id = ? ORDER BY c.ord",
+                (doc_id,)
+            ).fetchall()
+        return [row_to_chunk(*row) for row in rows]
+    
     def verify_user(self, username: str, password: str) -> Optional[Dict]:
         """Verify user credentials."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.execute(
-                "SELECT user_id, username, role FROM users WHERE username = ? AND password = ?",
-                (username, password)
-            )
-            user = cursor.fetchone()
-            return dict(user) if user else None
+        with self.pool.connection() as conn:
+            return authenticate(conn, username, password)
     
     def create_user(self, username: str, password: str, role: str = "user") -> Optional[str]:
         """Create a new user."""
         user_id = str(uuid.uuid4())
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             try:
                 conn.execute(
                     "INSERT INTO users VALUES (?, ?, ?, ?)",
-                    (user_id, username, password, role)
+                    (user_id, username, hash_password(password), role)
                 )
                 conn.commit()
                 return user_id
@@ -0,0 +1,34 @@
+# passwords.py - Password hashing shared by the SQLite and Supabase user stores
+import hashlib
+import hmac
+import os
+
+PASSWORD_SCHEME = "scrypt"
+SCRYPT_PARAMS = {"n": 2 ** 14, "r": 8, "p": 1}
+
+# Formats of rows written before scrypt, rehashed on their next login
+LEGACY_PLAINTEXT = "plaintext"  # SQLite users table
+LEGACY_SHA256 = "sha256"        # Supabase users table: unsalted hex digest
+
+def hash_password(password: str) -> str:
+    """Salted scrypt hash for the users.password column."""
+    salt = os.urandom(16)
+    key = hashlib.scrypt(password.encode(), salt=salt, **SCRYPT_PARAMS)
+    return f"{PASSWORD_SCHEME}${salt.hex()}${key.hex()}"
+
+def needs_rehash(stored: str) -> bool:
+    """True for a stored value in a legacy format rather than scrypt."""
+    return not stored.startswith(PASSWORD_SCHEME + "$")
+
+def check_password(password: str, stored: str, legacy: str) -> bool:
+    """
+    Constant-time check of a password against its stored value: a scrypt
+    hash, or else the store's `legacy` format.
+    """
+    if not needs_rehash(stored):
+        salt, _, key = stored[len(PASSWORD_SCHEME) + 1:].partition("$")
+        candidate = hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt), **SCRYPT_PARAMS)
+        return hmac.compare_digest(candidate.hex(), key)
+    if legacy == LEGACY_SHA256:
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    return hmac.compare_digest(password.encode(), stored.encode())
@@ -1,176 +1,244 @@
 # qa.py - Optimized with Lazy Loading & Startup Timeout Fix
-import os
-from typing import List, Dict
+from typing import List, Dict, Iterator, Optional, Tuple
 import streamlit as st
-import google.generativeai as genai
-from dotenv import load_dotenv
+from clients import get_gemini_model
+from qa_cache import ExactCache, prompt_key
 
-def initialize_gemini_client():
-    """Initialize Gemini with robust error handling."""
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+# Static list: model choices are shown on every rerun without an API call
+AUTO_MODEL = "auto"
+AVAILABLE_MODELS = ("gemini-2.0-flash", "gemini-1.5-flash", "gemini-1.5-pro-001", AUTO_MODEL)
+DEFAULT_MODEL = AVAILABLE_MODELS[0]
+
+# Answer phrases checked on every response
+GENERAL_KNOWLEDGE_HEADER = "## general knowledge"
+REFUSAL_PHRASES = ("documents don't contain", "cannot find", "no information", "not mentioned")
+APOLOGY_PHRASES = ("sorry", "cannot find", "no information")
+
+GENERATION_CONFIG = {"temperature": 0.3, "max_output_tokens": 3000}
+
+# Raised when Gemini finishes without any answer text (e.g. a blocked reply)
+EMPTY_ANSWER_ERROR = "Gemini returned no answer text (the response may have been blocked)"
+
+# Model cascade for AUTO_MODEL (opt-in): short lookups with little context
+# go to the small model, analytical questions to the large one, everything
+# else to the default
+SHORT_QUERY_WORDS = 8
+SHORT_QUERY_CHUNKS = 2
+SHORT_MODEL = "gemini-1.5-flash-8b"
+SHORT_GENERATION_CONFIG = {"temperature": 0.3, "max_output_tokens": 512}
+REASONING_MODEL = "gemini-1.5-pro-001"
+REASONING_GENERATION_CONFIG = {"temperature": 0.3, "max_output_tokens": 4000}
+STANDARD_MODEL = "gemini-2.0-flash"
+REASONING_PHRASES = ("compare", "contrast", "analy", "evaluate", "critically",
+                     "discuss", "distinguish", "difference between")
+
+# Context sent with each question: top chunks, each trimmed
+CONTEXT_CHUNKS = 3
+CONTEXT_CHARS = 600
+
+# Kept short: prefill time (and so time to first token) grows with prompt length
+PROMPT_TEMPLATE = """ROLE: Legal expert and law mentor on world law and jurisprudence.
+
+QUESTION: {query}
+
+DOCUMENT CONTEXT:
+{context}
+
+RULES: Never refuse. Answer from the documents; if they are silent, answer from general legal knowledge under the heading `## General Knowledge`. Cite a filename only when quoting it. Write concise markdown study notes, answer multiple questions in order, and cite the country's case law where useful.
+
+ANSWER:"""
+
+@st.cache_resource
+def get_exact_cache() -> ExactCache:
+    """Answers by exact prompt, shared by all sessions."""
+    return ExactCache()
+
+def select_model(query: str, chunks: List[Dict],
+                 model: str = DEFAULT_MODEL) -> Tuple[str, Dict]:
+    """
+    Model name and generation config for a question.
+    An explicit model choice is kept; AUTO_MODEL routes by query shape.
+    """
+    if model != AUTO_MODEL:
+        return model, GENERATION_CONFIG
     
-    if not api_key:
-        try:
-            api_key = st.secrets["GOOGLE_API_KEY"]
-        except:
-            pass
+    if len(query.split()) < SHORT_QUERY_WORDS and len(chunks) <= SHORT_QUERY_CHUNKS:
+        return SHORT_MODEL, SHORT_GENERATION_CONFIG
+    query_lower = query.lower()
+    if any(phrase in query_lower for phrase in REASONING_PHRASES):
+        return REASONING_MODEL, REASONING_GENERATION_CONFIG
+    return STANDARD_MODEL, GENERATION_CONFIG
+
+def _unavailable_result() -> Dict:
+    return {
+        "answer": "⚠️ Gemini API not available. Please add your API key to Streamlit Cloud Secrets.",
+        "sources": [],
+        "model_used": None,
+        "used_general_knowledge": False,
+        "has_document_context": False,
+        "refusal_detected": False
+    }
+
+def _error_result(e: Exception, has_document_context: bool) -> Dict:
+    return {
+        "answer": f"Error: {str(e)}",
+        "sources": [],
+        "error": str(e),
+        "model_used": None,
+        "used_general_knowledge": False,
+        "has_document_context": has_document_context,
+        "refusal_detected": False
+    }
+
+def _build_prompt(query: str, chunks: List[Dict]) -> str:
+    if chunks:
+        context = "\n\n".join([
+            f"[FROM DOCUMENT: {chunk['filename']} ({chunk['country']})]\n"
+            f"{chunk['text'][:CONTEXT_CHARS]}"
+            for chunk in chunks[:CONTEXT_CHUNKS]
+        ])
+    else:
+        context = "NO_DOCUMENTS_AVAILABLE"
+    
+    return PROMPT_TEMPLATE.format_map({"query": query, "context": context})
+
+def _build_result(chunks: List[Dict], model: str, answer: str) -> Dict:
+    """Turn a complete Gemini answer into the result dict (sources, cleanup)."""
+    # Only the chunks actually sent to Gemini can be sources
+    chunks = chunks[:CONTEXT_CHUNKS]
+    has_document_context = len(chunks) > 0
+    answer_lower = answer.lower()
     
-    if not api_key:
-        st.error("""
-        ### 🔴 NO API KEY FOUND
+    # ===== SOURCE DETECTION =====
+    sources = []
+    used_general_knowledge = False
+    
+    if has_document_context:
+        # Answer words are split once; each chunk's opening words are then set lookups
+        answer_words = set(answer_lower.split())
         
-        **Get your FREE key from:** https://aistudio.google.com/app/apikey 
+        # Find actual document references
+        for chunk in chunks:
+            country_lower = chunk['country'].lower()
+            filename_lower = chunk['filename'].lower()
+            
+            # Fuzzy matching
+            if (country_lower in answer_lower or 
+                filename_lower.replace('.pdf', '') in answer_lower or
+                not answer_words.isdisjoint(chunk['text'][:200].lower().split()[:10])):
+                
+                source_info = f"{chunk['country']} - {chunk['filename']}"
+                if source_info not in sources:
+                    sources.append(source_info)
         
-        **Then create `.env` file with:**
-        ```
-        GEMINI_API_KEY=AIzaSyYourKeyHere
-        ```
-        """)
-        st.stop()
+        # If no clear references, it used general knowledge
+        used_general_knowledge = len(sources) == 0
+        
+        # The prompt has Gemini label its own fallback; refusals are a backup check
+        if (GENERAL_KNOWLEDGE_HEADER in answer_lower or
+                any(phrase in answer_lower for phrase in REFUSAL_PHRASES)):
+            used_general_knowledge = True
     
-    if not api_key.startswith("AIza"):
-        st.error("❌ Invalid key format. Must start with 'AIza...'")
-        st.stop()
+    # Clean up apologetic language
+    cleaned_answer = answer
+    if used_general_knowledge and has_document_context:
+        lines = [line for line in answer.split('\n') if not any(phrase in line.lower() for phrase in APOLOGY_PHRASES)]
+        cleaned_answer = '\n'.join(lines)
     
-    genai.configure(api_key=api_key)
-    return genai
-
-# === LAZY LOADING WITH CACHING ===
-@st.cache_resource
-def get_gemini_client():
-    """Initialize Gemini only once per session - prevents startup timeout"""
-    try:
-        genai = initialize_gemini_client()
-        st.sidebar.success("✅ Gemini API connected")
-        return genai
-    except Exception as e:
-        st.sidebar.error(f"❌ Gemini init failed: {e}")
-        st.sidebar.info("Check your API key in Streamlit Cloud Secrets")
-        return None
-
-DEFAULT_MODEL = "gemini-2.0-flash"
+    return {
+        "answer": cleaned_answer,
+        "sources": sources,
+        "model_used": model,
+        "chunks_used": len(chunks),
+        "used_general_knowledge": used_general_knowledge,
+        "has_document_context": has_document_context,
+        "refusal_detected": False
+    }
 
 def get_answer_from_chunks(query: str, chunks: List[Dict], 
                           model: str = DEFAULT_MODEL) -> Dict:
     """
-    Force Gemini to answer - retries with general knowledge if refusal detected.
+    Force Gemini to answer - the prompt has it fall back to general
+    knowledge in the same response instead of refusing.
     """
-    # LAZY INITIALIZE HERE - only when needed
-    genai = get_gemini_client()
-    if genai is None:
-        return {
-            "answer": "⚠️ Gemini API not available. Please add your API key to Streamlit Cloud Secrets.",
-            "sources": [],
-            "model_used": None,
-            "used_general_knowledge": False,
-            "has_document_context": False,
-            "refusal_detected": False
-        }
+    model, generation_config = select_model(query, chunks, model)
+    # LAZY INITIALIZE HERE - only when needed (client and model are cached)
+    model_instance = get_gemini_model(model)
+    if model_instance is None:
+        return _unavailable_result()
     
-    has_document_context = len(chunks) > 0
-    
-    if has_document_context:
-        context_parts = []
-        for i, chunk in enumerate(chunks[:5]):
-            context_parts.append(
-                f"[FROM DOCUMENT: {chunk['filename']} ({chunk['country']})]\n"
-                f"{chunk['text'][:1200]}..."
-            )
-        context = "\n\n".join(context_parts)
-    else:
-        context = "NO_DOCUMENTS_AVAILABLE"
-    
-    # BULLETPROOF PROMPT
-    prompt = f"""ROLE: You are a legal expert and act as a Law mentor on World law and jurisprudence.
-
-QUESTION: {query}
-
-DOCUMENT CONTEXT:
-{context}
-
-ABSOLUTE RULES:
-1. **NEVER** refuse to answer or say "documents don't contain this"
-2. **ALWAYS** provide answer - use documents OR general knowledge
-3. For "qatal e amad", "diyat", "qisas" - use your legal training if docs unclear
-4. Cite sources only if clearly from documents
-5. Format notes/headings as requested with markdown
-6. Prepare notes for study - concise, clear, structured
-7. Answer multiple questions in order if asked
-8. Refer case laws according to country legal system where necessary or asked by user
-
-ANSWER IMMEDIATELY:"""
+    prompt = _build_prompt(query, chunks)
+    key = prompt_key(model, prompt)
+    cached = get_exact_cache().get(key)
+    if cached is not None:
+        return cached
     
     try:
-        model_instance = genai.GenerativeModel(model)
         response = model_instance.generate_content(
             prompt,
-            generation_config={"temperature": 0.3, "max_output_tokens": 3000}
+            generation_config=generation_config
         )
+        if not response.text.strip():
+            raise ValueError(EMPTY_ANSWER_ERROR)
+        result = _build_result(chunks, model, response.text)
+        get_exact_cache().put(key, result)
+        return result
+    
+    except Exception as e:
+        return _error_result(e, len(chunks) > 0)
+
+class AnswerStream:
+    """
+    Streams the answer text as Gemini generates it.
+    Iterate to receive text pieces; `result` holds the final dict afterwards.
+    """
+    def __init__(self, query: str, chunks: List[Dict], model: str = DEFAULT_MODEL):
+        self.query = query
+        self.chunks = chunks
+        self.model, self.generation_config = select_model(query, chunks, model)
+        self.result: Optional[Dict] = None
+    
+    def __iter__(self) -> Iterator[str]:
+        model_instance = get_gemini_model(self.model)
+        if model_instance is None:
+            self.result = _unavailable_result()
+            yield self.result['answer']
+            return
         
-        answer = response.text
-        
-        # ===== FORCE RETRY ON REFUSAL =====
-        if "documents don't contain" in answer.lower() or "cannot find" in answer.lower():
-            # Force general knowledge by clearing chunks and retrying
-            st.warning("🔄 Document search failed, using general knowledge...")
-            return get_answer_from_chunks(query=query, chunks=[], model=model)
-        
-        # ===== SOURCE DETECTION =====
-        sources = []
-        used_general_knowledge = False
+        prompt = _build_prompt(self.query, self.chunks)
+        key = prompt_key(self.model, prompt)
+        cached = get_exact_cache().get(key)
+        if cached is not None:
+            self.result = cached
+            yield cached['answer']
+            return
         
-        if has_document_context and "NO_DOCUMENTS_AVAILABLE" not in context:
-            answer_lower = answer.lower()
-            
-            # Find actual document references
-            for chunk in chunks:
-                country_lower = chunk['country'].lower()
-                filename_lower = chunk['filename'].lower()
-                
-                # Fuzzy matching
-                if (country_lower in answer_lower or 
-                    filename_lower.replace('.pdf', '') in answer_lower or
-                    any(term in answer_lower for term in chunk['text'][:200].lower().split()[:10])):
-                    
-                    source_info = f"{chunk['country']} - {chunk['filename']}"
-                    if source_info not in sources:
-                        sources.append(source_info)
+        parts = []
+        try:
+            response = model_instance.generate_content(
+                prompt,
+                generation_config=self.generation_config,
+                stream=True
+            )
+            for piece in response:
+                try:
+                    text = piece.text
+                except ValueError:
+                    # Final/blocked pieces can carry no text parts
+                    continue
+                parts.append(text)
+                yield text
             
-            # If no clear references, it used general knowledge
-            used_general_knowledge = len(sources) == 0
+            answer = "".join(parts)
+            if not answer.strip():
+                # Every piece was blocked/empty: report it, and keep it out of the caches
+                raise ValueError(EMPTY_ANSWER_ERROR)
             
-            # Check for refusal patterns (backup check)
-            refusal_phrases = ["documents don't contain", "cannot find", "no information", "not mentioned"]
-            if any(phrase in answer_lower for phrase in refusal_phrases):
-                used_general_knowledge = True
+            self.result = _build_result(self.chunks, self.model, answer)
+            get_exact_cache().put(key, self.result)
         
-        # Clean up apologetic language
-        cleaned_answer = answer
-        if used_general_knowledge and has_document_context:
-            lines = [line for line in answer.split('\n') if not any(phrase in line.lower() for phrase in ["sorry", "cannot find", "no information"])]
-            cleaned_answer = '\n'.join(lines)
-        
-        return {
-            "answer": cleaned_answer,
-            "sources": sources,
-            "model_used": model,
-            "chunks_used": len(chunks),
-            "used_general_knowledge": used_general_knowledge,
-            "has_document_context": has_document_context,
-            "refusal_detected": False  # Will be True only on first attempt
-        }
-    
-    except Exception as e:
-        return {
-            "answer": f"Error: {str(e)}",
-            "sources": [],
-            "error": str(e),
-            "model_used": None,
-            "used_general_knowledge": False,
-            "has_document_context": has_document_context,
-            "refusal_detected": False
-        }
-
-def get_available_models() -> List[str]:
-    return ["gemini-2.0-flash", "gemini-1.5-flash", "gemini-1.5-pro-001"]
\ No newline at end of file
+        except Exception as e:
+            self.result = _error_result(e, len(self.chunks) > 0)
+
+def get_available_models() -> Tuple[str, ...]:
+    return AVAILABLE_MODELS
\ No newline at end of file
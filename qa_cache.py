@@ -0,0 +1,98 @@
+# qa_cache.py - Semantic and exact-prompt caches for answered questions
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+SIMILARITY_THRESHOLD = 0.95
+MAX_ENTRIES = 200
+EXACT_MAX_ENTRIES = 500
+EXACT_TTL_SECONDS = 3600
+
+
+class SemanticCache:
+    """
+    LRU cache of answers keyed by normalized question embeddings.
+    Near-duplicate questions within the same scope reuse the stored answer.
+    Thread-safe, so one instance can serve every session.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD,
+                 max_entries: int = MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # entry_id -> (scope, embedding, result)
+        self._ids = count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, scope: Tuple, embedding: np.ndarray) -> Optional[Dict]:
+        """Return the cached result for the most similar question in scope."""
+        with self._lock:
+            candidates = [
+                (entry_id, entry[1]) for entry_id, entry in self._entries.items()
+                if entry[0] == scope
+            ]
+            if not candidates:
+                return None
+
+            scores = np.stack([vector for _, vector in candidates]) @ embedding
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = candidates[best][0]
+            self._entries.move_to_end(entry_id)
+            return self._entries[entry_id][2]
+
+    def add(self, scope: Tuple, embedding: np.ndarray, result: Dict) -> None:
+        """Store a result, evicting the least recently used entry when full."""
+        with self._lock:
+            self._entries[next(self._ids)] = (scope, embedding, result)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def prompt_key(model: str, prompt: str) -> str:
+    """SHA-256 of the exact model + prompt sent to Gemini."""
+    return hashlib.sha256(f"{model}\0{prompt}".encode()).hexdigest()
+
+
+class ExactCache:
+    """
+    LRU cache of answers keyed by prompt_key, with a TTL.
+    Identical prompts (same question, context and model) skip Gemini.
+    """
+
+    def __init__(self, max_entries: int = EXACT_MAX_ENTRIES,
+                 ttl: float = EXACT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, result: Dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
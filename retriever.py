@@ -0,0 +1,160 @@
+# retriever.py - Embedding-based chunk retrieval
+import base64
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from clients import get_gemini_client
+from chunking import KeywordIndex, find_relevant_chunks, rank_chunks
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+QUANTIZATION_QUANTILE = 0.99
+
+# Gemini batch embedding accepts at most 100 texts per request
+EMBED_BATCH_SIZE = 100
+EMBED_MAX_WORKERS = 4
+
+# Reciprocal Rank Fusion: constant and how deep each ranking is read
+RRF_K = 60
+RRF_CANDIDATES = 4
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so inner product equals cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_embedding(vector: np.ndarray) -> Tuple[str, float]:
+    """
+    Scalar-quantize a vector to int8, clipping at its 0.99 quantile.
+    Returns the base64-encoded codes and the scale to dequantize them.
+    """
+    clip = float(np.quantile(np.abs(vector), QUANTIZATION_QUANTILE)) or 1.0
+    scale = clip / 127.0
+    codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return base64.b64encode(codes.tobytes()).decode('ascii'), scale
+
+
+def _decode_embedding(chunk: Dict) -> Tuple[np.ndarray, float]:
+    """Read a chunk's stored int8 codes (or legacy float list) and scale."""
+    embedding = chunk['embedding']
+    if isinstance(embedding, str):
+        codes = np.frombuffer(base64.b64decode(embedding), dtype=np.int8)
+        return codes, float(chunk['embedding_scale'])
+
+    encoded, scale = quantize_embedding(np.asarray(embedding, dtype=np.float32))
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.int8), scale
+
+
+def embed_texts(texts: List[str], task_type: str = "retrieval_document") -> Optional[np.ndarray]:
+    """Embed texts with Gemini, returning a normalized (n, dim) matrix."""
+    if not texts:
+        return None
+
+    genai = get_gemini_client()
+    if genai is None:
+        return None
+
+    def embed_batch(batch: List[str]) -> List[List[float]]:
+        return genai.embed_content(model=EMBEDDING_MODEL, content=batch, task_type=task_type)['embedding']
+
+    # The API caps texts per request, so large uploads are split into
+    # batches that are sent concurrently and reassembled in order
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    if len(batches) == 1:
+        vectors = embed_batch(batches[0])
+    else:
+        with ThreadPoolExecutor(max_workers=min(EMBED_MAX_WORKERS, len(batches))) as executor:
+            vectors = [vector for batch in executor.map(embed_batch, batches) for vector in batch]
+    return _normalize(np.asarray(vectors, dtype=np.float32))
+
+
+def embed_query(query: str) -> Optional[np.ndarray]:
+    """Embed a single question for searching the chunk index."""
+    vectors = embed_texts([query], task_type="retrieval_query")
+    return vectors[0] if vectors is not None else None
+
+
+def embed_chunks(chunks: List[Dict]) -> List[Dict]:
+    """Attach an embedding to each chunk at upload time."""
+    vectors = embed_texts([chunk['text'] for chunk in chunks])
+    if vectors is None:
+        return chunks
+
+    # Stored as int8 codes: 4x smaller than float32 in JSON and in memory
+    for chunk, vector in zip(chunks, vectors):
+        chunk['embedding'], chunk['embedding_scale'] = quantize_embedding(vector)
+    return chunks
+
+
+class VectorIndex:
+    """Flat inner-product index over the int8 embeddings stored on chunks."""
+
+    def __init__(self, chunks: List[Dict]):
+        self.chunks = [chunk for chunk in chunks if chunk.get('embedding')]
+        self.codes = None
+        self.scales = None
+        if self.chunks:
+            decoded = [_decode_embedding(chunk) for chunk in self.chunks]
+            self.codes = np.stack([codes for codes, _ in decoded])
+            self.scales = np.asarray([scale for _, scale in decoded], dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5) -> List[Dict]:
+        """Return the top_k chunks by (asymmetric float query x int8) cosine."""
+        if self.codes is None:
+            return []
+
+        scores = (self.codes @ query_vector) * self.scales
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.chunks[i] for i in top]
+
+
+def fuse_rankings(rankings: List[List[Dict]], top_k: int = 5) -> List[Dict]:
+    """Reciprocal Rank Fusion: score each chunk by sum(1 / (RRF_K + rank))."""
+    scores = {}
+    chunks_by_id = {}
+    for ranking in rankings:
+        for rank, chunk in enumerate(ranking, start=1):
+            key = id(chunk)
+            chunks_by_id[key] = chunk
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+
+    best = heapq.nlargest(top_k, scores, key=scores.get)
+    return [chunks_by_id[key] for key in best]
+
+
+def find_semantic_chunks(query: str, chunks: List[Dict], top_k: int = 5,
+                         index: Optional[VectorIndex] = None,
+                         query_vector: Optional[np.ndarray] = None,
+                         keyword_index: Optional[KeywordIndex] = None) -> List[Dict]:
+    """
+    Hybrid search: nearest neighbours over precomputed chunk embeddings
+    fused with the BM25 keyword ranking. Falls back to keyword search
+    alone when no embeddings are available.
+    """
+    if index is None:
+        index = VectorIndex(chunks)
+
+    if len(index) > 0:
+        try:
+            if query_vector is None:
+                query_vector = embed_query(query)
+            if query_vector is not None:
+                if keyword_index is None:
+                    keyword_index = KeywordIndex(chunks)
+                depth = top_k * RRF_CANDIDATES
+                return fuse_rankings([
+                    index.search(query_vector, depth),
+                    rank_chunks(query, keyword_index, depth),
+                ], top_k)
+        except Exception:
+            pass
+
+    return find_relevant_chunks(query, chunks, top_k=top_k, index=keyword_index)
@@ -2,12 +2,14 @@
 import sys
 from pathlib import Path
 
-# Add project root to path
-sys.path.append(str(Path(__file__).parent))
-
-# Import main from app.py
-from app import main
+# Add project root to path (once - Streamlit re-executes this script on every rerun)
+ROOT = str(Path(__file__).parent)
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
 
 if __name__ == "__main__":
+    # Import main from app.py; after the first run it is already in sys.modules
+    from app import main
+    
     # Run main app
     main()
@@ -1,11 +1,31 @@
 import os
 import uuid
-import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 import streamlit as st
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+from passwords import LEGACY_SHA256, check_password, hash_password, needs_rehash
+
+# Columns for document lists; chunks (often MBs per document) are left out
+DOCUMENT_LIST_COLUMNS = "id,filename,country,doc_type,owner_id,owner_role,upload_date,preview"
+
+# Words of a search query; anything else would be tsquery syntax
+SEARCH_WORD_RE = re.compile(r"\w+")
+
+# Error codes for an RPC whose SQL function does not exist (yet):
+# PostgREST's schema-cache miss, and Postgres' undefined_function
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+# Rows per request when paging through chunks (PostgREST's default max-rows)
+CHUNK_PAGE_SIZE = 1000
+# Documents whose chunks are flattened per request (ids go in the URL)
+CHUNK_DOC_BATCH_SIZE = 100
 
 
 class SupabaseManager:
@@ -38,19 +58,31 @@ class SupabaseManager:
     def verify_user(self, username: str, password: str) -> Optional[Dict]:
         try:
             username = username.strip().lower()
-            password_hash = hashlib.sha256(password.strip().encode()).hexdigest()
+            password = password.strip()
 
+            # Fetch by username only; the hash is checked here and never returned
             result = (
                 self.client
                 .table("users")
-                .select("*")
+                .select("user_id, username, role, password")
                 .eq("username", username)
-                .eq("password", password_hash)
                 .limit(1)
                 .execute()
             )
+            if not result.data:
+                return None
 
-            return result.data[0] if result.data else None
+            user = result.data[0]
+            stored = user.pop("password")
+            if not check_password(password, stored, LEGACY_SHA256):
+                return None
+            if needs_rehash(stored):
+                # Legacy unsalted SHA-256; upgraded to scrypt on success
+                self.client.table("users").update(
+                    {"password": hash_password(password)}
+                ).eq("user_id", user["user_id"]).execute()
+
+            return user
 
         except Exception as e:
             st.error(f"❌ Login error: {e}")
@@ -68,6 +100,7 @@ class SupabaseManager:
         owner_role: str,
         file_content: bytes,
         chunks: List[Dict],
+        preview: Optional[str] = None,
     ) -> Optional[str]:
         """
         Upload document to Supabase Storage and insert metadata
@@ -77,22 +110,15 @@ class SupabaseManager:
             # Generate unique document ID
             doc_id = str(uuid.uuid4())
             file_path = f"{owner_id}/{doc_id}_{filename}"
+            bucket = self.client.storage.from_("documents")
 
-            # 1. Upload file to storage (using admin_client to bypass RLS)
-            storage_response = self.client.storage.from_("documents").upload(
-                file_path,
-                file_content
-            )
-            
-            if not storage_response:
-                st.error("❌ Storage upload failed")
-                return None
+            # Public URL is built from the path locally - no request, so the
+            # metadata row doesn't have to wait for the upload
+            public_url = bucket.get_public_url(file_path)
 
-            # Get public URL
-            public_url = self.client.storage.from_("documents").get_public_url(file_path)
-
-            # 3. INSERT METADATA (same service key)
-            result = self.client.table("documents").insert({
+            # All chunks go in this one request as JSONB; returning=minimal
+            # stops PostgREST from echoing the whole chunk payload back
+            insert = self.client.table("documents").insert({
                 "id": doc_id,
                 "filename": filename,
                 "country": country,
@@ -102,10 +128,32 @@ class SupabaseManager:
                 "file_path": file_path,
                 "public_url": public_url,
                 "chunks": chunks,
+                "preview": preview,
                 "upload_date": datetime.utcnow().isoformat(),
-            }).execute()
+            }, returning=ReturnMethod.minimal)
+
+            # 1. Storage upload and 2. metadata insert run concurrently
+            # (same service key, bypasses RLS)
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                upload_job = pool.submit(bucket.upload, file_path, file_content)
+                insert_job = pool.submit(insert.execute)
+                upload_error = upload_job.exception()
+                insert_error = insert_job.exception()
+
+            upload_failed = upload_error is not None or not upload_job.result()
+            if upload_failed or insert_error is not None:
+                # Undo whichever half succeeded so no orphan file/row is left
+                self._rollback_document(
+                    doc_id, file_path,
+                    remove_file=not upload_failed,
+                    delete_row=insert_error is None,
+                )
+                if upload_error is not None or insert_error is not None:
+                    raise upload_error or insert_error
+                st.error("❌ Storage upload failed")
+                return None
 
-            return doc_id if result.data else None
+            return doc_id
 
         except Exception as e:
             # SPECIFIC ERROR MESSAGES
@@ -119,12 +167,26 @@ class SupabaseManager:
                 
             elif "bucket not found" in error_str:
                 st.error("🚨 'documents' bucket missing in Storage")
+
+            elif "preview" in error_str:
+                st.error("🚨 'preview' column missing! Run supabase_schema.sql in the SQL Editor")
                 
             else:
                 st.error(f"❌ Upload error: {e}")
             
             return None
 
+    def _rollback_document(self, doc_id: str, file_path: str,
+                           remove_file: bool, delete_row: bool) -> None:
+        """Best-effort cleanup after a half-completed add_document."""
+        try:
+            if remove_file:
+                self.client.storage.from_("documents").remove([file_path])
+            if delete_row:
+                self.client.table("documents").delete().eq("id", doc_id).execute()
+        except Exception:
+            pass  # The original error is the one worth reporting
+
     # -------------------------------------------------
     # FETCH DOCUMENTS
     # -------------------------------------------------
@@ -135,9 +197,51 @@ class SupabaseManager:
         country: Optional[str] = None,
         doc_type: Optional[str] = None,
     ) -> List[Dict]:
-        """Fetch documents with filters and role-based access"""
+        """Fetch document metadata (no chunks) with filters and role-based access"""
+        return self._fetch_documents(DOCUMENT_LIST_COLUMNS, user_id, user_role, country, doc_type)[0]
+
+    def get_documents_page(
+        self,
+        user_id: str,
+        user_role: str,
+        country: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 50,
+    ) -> Tuple[List[Dict], int]:
+        """One page of get_documents_by_filters, plus the total match count"""
+        return self._fetch_documents(
+            DOCUMENT_LIST_COLUMNS, user_id, user_role, country, doc_type, offset, limit
+        )
+
+    def get_documents_with_chunks(
+        self,
+        user_id: str,
+        user_role: str,
+        country: Optional[str] = None,
+        doc_type: Optional[str] = None,
+    ) -> List[Dict]:
+        """Like get_documents_by_filters, but including the chunks JSONB"""
+        return self._fetch_documents(
+            f"{DOCUMENT_LIST_COLUMNS},chunks", user_id, user_role, country, doc_type
+        )[0]
+
+    def _fetch_documents(
+        self,
+        columns: str,
+        user_id: str,
+        user_role: str,
+        country: Optional[str],
+        doc_type: Optional[str],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[Dict], int]:
+        """Matching rows and their total; with a limit, only that page is sent."""
         try:
-            query = self.client.table("documents").select("*")
+            # The exact count rides on the same request, for the pager
+            query = self.client.table("documents").select(
+                columns, count="exact" if limit else None
+            )
 
             if user_role != "admin":
                 query = query.or_(f"owner_role.eq.admin,owner_id.eq.{user_id}")
@@ -149,75 +253,202 @@ class SupabaseManager:
                 query = query.eq("doc_type", doc_type)
 
             # Execute query
-            result = query.order("upload_date", desc=True).execute()
-            return result.data if result.data else []
+            return self._execute_page(query.order("upload_date", desc=True), offset, limit)
 
         except Exception as e:
             st.error(f"❌ Fetch error: {e}")
-            return []
+            return [], 0
+
+    @staticmethod
+    def _execute_page(query, offset: int, limit: Optional[int]) -> Tuple[List[Dict], int]:
+        if limit:
+            query = query.range(offset, offset + limit - 1)
+        result = query.execute()
+        rows = result.data if result.data else []
+        return rows, result.count if result.count is not None else len(rows)
 
     # -------------------------------------------------
     # SEARCH
     # -------------------------------------------------
     def search_documents(self, user_id: str, user_role: str, keyword: str) -> List[Dict]:
-        """Search documents by filename"""
+        """Search documents by filename and chunk text (GIN full-text index)"""
+        return self.search_documents_page(user_id, user_role, keyword, limit=None)[0]
+
+    def search_documents_page(
+        self,
+        user_id: str,
+        user_role: str,
+        keyword: str,
+        offset: int = 0,
+        limit: Optional[int] = 50,
+    ) -> Tuple[List[Dict], int]:
+        """One page of search_documents, plus the total match count"""
+        # Every word must match, each as a prefix so partial words still hit
+        words = SEARCH_WORD_RE.findall(keyword.lower())
+        if not words:
+            return self._fetch_documents(
+                DOCUMENT_LIST_COLUMNS, user_id, user_role, None, None, offset, limit
+            )
+
         try:
-            query = self.client.table("documents").select("*").ilike("filename", f"%{keyword}%")
+            query = (
+                self.client.table("documents")
+                .select(DOCUMENT_LIST_COLUMNS, count="exact" if limit else None)
+                .text_search("fts", " & ".join(f"{word}:*" for word in words), {"config": "simple"})
+            )
 
             if user_role != "admin":
                 query = query.or_(f"owner_role.eq.admin,owner_id.eq.{user_id}")
 
-            result = query.execute()
-            return result.data if result.data else []
+            return self._execute_page(query.order("upload_date", desc=True), offset, limit)
 
         except Exception as e:
-            st.error(f"❌ Search error: {e}")
-            return []
+            if "fts" in str(e).lower():
+                st.error("🚨 'fts' column missing! Run supabase_schema.sql in the SQL Editor")
+            else:
+                st.error(f"❌ Search error: {e}")
+            return [], 0
 
     # -------------------------------------------------
     # DELETE
     # -------------------------------------------------
     def delete_document(self, doc_id: str, user_id: str, user_role: str) -> bool:
         """Delete document and its storage file (Admin only)"""
+        deleted = self.delete_documents([doc_id], user_id, user_role)
+        if deleted:
+            st.success("✅ Document deleted")
+        elif deleted == 0:
+            st.error("❌ Document not found")
+        return bool(deleted)
+
+    def delete_documents(self, doc_ids: List[str], user_id: str, user_role: str) -> Optional[int]:
+        """
+        Delete documents and their storage files (Admin only).
+        Returns how many were deleted, or None on error.
+        """
         if user_role != "admin":
             st.error("❌ Only admins can delete documents")
-            return False
+            return None
 
         try:
-            # 1. Get file path
-            doc = self.client.table("documents")\
-                .select("file_path")\
-                .eq("id", doc_id)\
-                .execute()
-
-            if doc.data:
-                # 2. Delete from storage
-                file_path = doc.data[0]["file_path"]
-                self.client.storage.from_("documents").remove([file_path])
-                
-                # 3. Delete metadata
-                self.client.table("documents")\
-                    .delete()\
-                    .eq("id", doc_id)\
-                    .execute()
-                
-                st.success("✅ Document deleted")
-                return True
-            else:
-                st.error("❌ Document not found")
-                return False
+            try:
+                # 1. One round trip deletes the rows and returns their file paths
+                paths = self.client.rpc("delete_documents", {"ids": doc_ids}).execute().data or []
+            except APIError as e:
+                if e.code not in MISSING_FUNCTION_CODES:
+                    raise
+                # Function not created yet (see supabase_schema.sql) - select, then delete
+                paths = self._delete_document_rows(doc_ids)
+
+            # 2. One batch call removes every file (rows may have no file_path)
+            files = [path for path in paths if path]
+            if files:
+                self.client.storage.from_("documents").remove(files)
+            return len(paths)
 
         except Exception as e:
             st.error(f"❌ Delete error: {e}")
-            return False
+            return None
+
+    def _delete_document_rows(self, doc_ids: List[str]) -> List[str]:
+        docs = self.client.table("documents")\
+            .select("file_path")\
+            .in_("id", doc_ids)\
+            .execute()
+        if not docs.data:
+            return []
+
+        self.client.table("documents")\
+            .delete(returning=ReturnMethod.minimal)\
+            .in_("id", doc_ids)\
+            .execute()
+        return [doc["file_path"] for doc in docs.data]
+
+    # -------------------------------------------------
+    # CORPUS VERSION
+    # -------------------------------------------------
+    def get_corpus_stamp(self) -> Optional[str]:
+        """
+        Cheap fingerprint of the documents table (row count + latest
+        upload_date); changes on any upload or delete, from any instance.
+        """
+        try:
+            result = (
+                self.client
+                .table("documents")
+                .select("upload_date", count="exact")
+                .order("upload_date", desc=True)
+                .limit(1)
+                .execute()
+            )
+            latest = result.data[0]["upload_date"] if result.data else ""
+            return f"{result.count}:{latest}"
+
+        except Exception:
+            return None  # Fall back to the process-local version
 
     # -------------------------------------------------
     # CHUNKS ACCESS (FROM JSONB)
     # -------------------------------------------------
     def get_all_chunks(self, user_id: str, user_role: str) -> List[Dict]:
         """Extract all chunks from accessible documents"""
+        try:
+            return self._get_flat_chunks(user_id, user_role)
+        except Exception:
+            # View not created yet (see supabase_schema.sql) - flatten here
+            return self._flatten_document_chunks(user_id, user_role)
+
+    def _get_flat_chunks(self, user_id: str, user_role: str) -> List[Dict]:
+        """
+        Pre-flattened chunks from the documents_chunks_flat view. Accessible
+        document ids are paged over the documents table (index-backed, no
+        expansion), and each batch is flattened server-side on its own, so
+        no request re-expands the whole corpus.
+        """
+        chunks = []
+        start = 0
+        while True:
+            query = self.client.table("documents").select("id")
+
+            if user_role != "admin":
+                query = query.or_(f"owner_role.eq.admin,owner_id.eq.{user_id}")
+
+            result = (
+                query.order("upload_date", desc=True)
+                .order("id")
+                .range(start, start + CHUNK_DOC_BATCH_SIZE - 1)
+                .execute()
+            )
+            if result.data:
+                chunks.extend(self._get_flat_chunks_for([doc["id"] for doc in result.data]))
+            if len(result.data) < CHUNK_DOC_BATCH_SIZE:
+                return chunks
+            start += CHUNK_DOC_BATCH_SIZE
+
+    def _get_flat_chunks_for(self, doc_ids: List[str]) -> List[Dict]:
+        chunks = []
+        start = 0
+        while True:
+            # PostgREST caps each response, so page until a short page;
+            # offsets stay within this batch's chunks
+            result = (
+                self.client.table("documents_chunks_flat")
+                .select("chunk")
+                .in_("doc_id", doc_ids)
+                .order("upload_date", desc=True)
+                .order("doc_id")
+                .order("ord")
+                .range(start, start + CHUNK_PAGE_SIZE - 1)
+                .execute()
+            )
+            chunks.extend(row["chunk"] for row in result.data)
+            if len(result.data) < CHUNK_PAGE_SIZE:
+                return chunks
+            start += CHUNK_PAGE_SIZE
+
+    def _flatten_document_chunks(self, user_id: str, user_role: str) -> List[Dict]:
         chunks = []
-        docs = self.get_documents_by_filters(user_id, user_role)
+        docs = self.get_documents_with_chunks(user_id, user_role)
 
         for doc in docs:
             for ch in doc.get("chunks", []):
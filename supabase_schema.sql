@@ -0,0 +1,78 @@
+-- Schema changes for the Supabase "documents" table.
+-- Run in the Supabase SQL Editor; every statement is safe to re-run.
+
+-- Preview text computed once at upload (shown in the document list)
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS preview TEXT;
+
+-- Document lists no longer fetch chunks, so older rows get their preview
+-- from the first chunk here (same shape as get_preview_text(text, 300))
+UPDATE documents
+SET preview = replace(left(chunks->0->>'text', 300), E'\n', ' ')
+    || CASE WHEN length(chunks->0->>'text') > 300 THEN '...' ELSE '' END
+WHERE preview IS NULL AND jsonb_array_length(chunks) > 0;
+
+-- One row per chunk, with its document's metadata merged in server-side,
+-- so get_all_chunks receives ready-to-use chunk objects
+CREATE OR REPLACE VIEW documents_chunks_flat WITH (security_invoker = true) AS
+SELECT
+    d.id AS doc_id,
+    d.owner_id,
+    d.owner_role,
+    d.upload_date,
+    c.ord,
+    c.chunk || jsonb_build_object(
+        'filename', d.filename,
+        'country', d.country,
+        'doc_type', d.doc_type
+    ) AS chunk
+FROM documents d
+CROSS JOIN LATERAL jsonb_array_elements(coalesce(d.chunks, '[]'::jsonb))
+    WITH ORDINALITY AS c(chunk, ord);
+
+-- Full-text search over filenames and chunk text (search_documents).
+-- Only the chunks' "text" fields are indexed, not embeddings or metadata;
+-- dots in filenames are split so "Penal.pdf" indexes "penal" and "pdf".
+-- The jsonb overload of to_tsvector parses each text value as a string;
+-- casting the array to text would index the JSON escapes, so "\nSection"
+-- became the unsearchable token "nsection".
+-- An fts column built by the earlier ::text expression is dropped (with
+-- its index) and rebuilt; the column comment marks the current version.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = 'documents'::regclass AND attname = 'fts' AND NOT attisdropped
+          AND col_description(attrelid, attnum) IS DISTINCT FROM 'jsonb text values'
+    ) THEN
+        ALTER TABLE documents DROP COLUMN fts;
+    END IF;
+END $$;
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS fts tsvector
+    GENERATED ALWAYS AS (
+        to_tsvector('simple', replace(coalesce(filename, ''), '.', ' ')) ||
+        to_tsvector('simple', coalesce(jsonb_path_query_array(chunks, '$[*].text'), '[]'::jsonb))
+    ) STORED;
+COMMENT ON COLUMN documents.fts IS 'jsonb text values';
+CREATE INDEX IF NOT EXISTS documents_fts_idx ON documents USING GIN (fts);
+
+-- Document lists (get_documents_by_filters, get_corpus_stamp) filter by
+-- access and country/type and sort newest first. Users see their own rows
+-- (owner_id) OR admin rows, which Postgres answers with a BitmapOr of
+-- the two indexes below; the plain upload_date index serves admins.
+CREATE INDEX IF NOT EXISTS idx_docs_owner_country_type
+    ON documents (owner_id, country, doc_type, upload_date DESC);
+CREATE INDEX IF NOT EXISTS idx_docs_admin_upload
+    ON documents (upload_date DESC) WHERE owner_role = 'admin';
+CREATE INDEX IF NOT EXISTS idx_docs_upload
+    ON documents (upload_date DESC);
+
+-- Deletes documents in one statement and returns their storage paths,
+-- so delete_documents needs one round trip plus one storage remove()
+CREATE OR REPLACE FUNCTION delete_documents(ids uuid[])
+RETURNS text[] LANGUAGE sql AS $$
+    WITH deleted AS (
+        DELETE FROM documents WHERE id = ANY(ids) RETURNING file_path
+    )
+    SELECT coalesce(array_agg(file_path), '{}') FROM deleted
+$$;
@@ -0,0 +1,50 @@
+# test_chunking.py - Run with: python -m pytest test_chunking.py
+import random
+
+import pytest
+
+from chunking import chunk_text
+
+
+def _legal_text(seed: int, paragraphs: int = 60) -> str:
+    """Paragraphs of varied length, from one-line headings to long sections."""
+    rng = random.Random(seed)
+    words = ("section", "court", "diyat", "qisas", "offence", "accused", "penalty", "act")
+    return "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(2, 120)))
+        for _ in range(paragraphs)
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("chunk_size,overlap", [(1000, 200), (800, 100), (300, 50)])
+def test_next_chunk_starts_with_overlap_of_previous(seed, chunk_size, overlap):
+    chunks = chunk_text(_legal_text(seed), "doc", chunk_size=chunk_size, overlap=overlap)
+    assert len(chunks) > 1
+
+    for prev, nxt in zip(chunks, chunks[1:]):
+        prev_text, next_text = prev['text'], nxt['text']
+        # The next chunk opens with a suffix of the previous one...
+        carried = max(
+            n for n in range(1, len(prev_text) + 1)
+            if next_text.startswith(prev_text[-n:])
+        )
+        # ...at least `overlap` characters long (or the whole previous chunk),
+        # less any whitespace stripped from the front of the carried tail
+        assert carried >= len(prev_text[-overlap:].lstrip())
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chunks_never_start_or_end_with_whitespace(seed):
+    text = "\n\n".join([_legal_text(seed, 20), "\n\n".join(["word " * 60] * 4)])
+    for c in chunk_text(text, "doc", chunk_size=400, overlap=50):
+        assert not c['text'][0].isspace()
+        assert not c['text'][-1].isspace()
+
+
+def test_no_overlap():
+    chunks = chunk_text(_legal_text(0), "doc", chunk_size=500, overlap=0)
+    assert not any(
+        nxt['text'].startswith(prev['text'][-20:])
+        for prev, nxt in zip(chunks, chunks[1:])
+    )
@@ -1,76 +1,108 @@
 # text_extraction.py - Works with file content (bytes)
-import pdfplumber
-from docx import Document
-import pytesseract
-from PIL import Image
+# Parser libraries are imported per format, so importing this module
+# (e.g. for get_preview_text in the app) stays cheap.
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import BinaryIO, Optional, List, Dict, Tuple, Union
+from chunking import chunk_text
 
-def extract_text_from_pdf_file(file_content: bytes) -> str:
-    """Extract text from PDF content."""
+# Uploads arrive as bytes (e.g. sent to a worker process) or as a file object
+FileSource = Union[bytes, BinaryIO]
+
+IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg'})
+
+# A PDF is treated as scanned when its first pages carry almost no text
+SCAN_SAMPLE_PAGES = 3
+SCAN_MIN_CHARS = 100
+
+def extract_text_from_pdf_file(file_content: FileSource) -> str:
+    """Extract text from PDF content, falling back to OCR for scanned PDFs."""
+    import fitz  # PyMuPDF
     try:
-        temp_path = "/tmp/temp_pdf.pdf"
-        with open(temp_path, "wb") as f:
-            f.write(file_content)
-        
-        text = ""
-        with pdfplumber.open(temp_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
+        with fitz.open(stream=_as_bytes(file_content), filetype="pdf") as pdf:
+            # Scanned PDFs have no text layer - sample the first pages to decide
+            sample = sum(len(pdf[i].get_text("text")) for i in range(min(SCAN_SAMPLE_PAGES, pdf.page_count)))
+            if sample < SCAN_MIN_CHARS:
+                text = "\n\n".join(_ocr_pdf_pages(pdf)).strip()
+            else:
+                # Blank line between pages so chunking treats them as paragraphs
+                text = "\n\n".join(page.get_text("text") for page in pdf).strip()
         
-        os.remove(temp_path)
-        return text.strip()
+        return text
     except Exception as e:
         raise Exception(f"PDF extraction failed: {str(e)}")
 
-def extract_text_from_docx_file(file_content: bytes) -> str:
+def _ocr_pdf_pages(pdf) -> List[str]:
+    """
+    OCR every page of a scanned PDF, in page order.
+    MuPDF is not thread-safe, so pages are rendered here one at a time;
+    tesseract runs as a subprocess, so the OCR calls run on threads,
+    one batch of pages per worker count to bound memory.
+    """
+    import pytesseract
+    from PIL import Image
+    
+    workers = max(1, min(os.cpu_count() or 1, pdf.page_count))
+    texts = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, pdf.page_count, workers):
+            images = []
+            for i in range(start, min(start + workers, pdf.page_count)):
+                pix = pdf[i].get_pixmap(dpi=200)
+                images.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+            texts.extend(executor.map(pytesseract.image_to_string, images))
+    return texts
+
+def _as_stream(source: FileSource) -> BinaryIO:
+    """Wrap raw bytes as an in-memory stream; file objects pass through."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    source.seek(0)
+    return source
+
+def _as_bytes(source: FileSource) -> bytes:
+    """Raw bytes for parsers that need a buffer (PyMuPDF, text decoding)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    source.seek(0)
+    return source.read()
+
+def extract_text_from_docx_file(file_content: FileSource) -> str:
     """Extract text from DOCX content."""
+    from docx import Document
     try:
-        temp_path = "/tmp/temp_docx.docx"
-        with open(temp_path, "wb") as f:
-            f.write(file_content)
-        
-        doc = Document(temp_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        
-        os.remove(temp_path)
-        return text.strip()
+        doc = Document(_as_stream(file_content))
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs).strip()
     except Exception as e:
         raise Exception(f"DOCX extraction failed: {str(e)}")
 
-def extract_text_from_image_file(file_content: bytes) -> str:
+def extract_text_from_image_file(file_content: FileSource) -> str:
     """Extract text from image content."""
+    import pytesseract
+    from PIL import Image
     try:
-        temp_path = "/tmp/temp_image.png"
-        with open(temp_path, "wb") as f:
-            f.write(file_content)
-        
-        image = Image.open(temp_path)
-        text = pytesseract.image_to_string(image)
-        
-        os.remove(temp_path)
-        return text.strip()
+        with Image.open(_as_stream(file_content)) as image:
+            return pytesseract.image_to_string(image).strip()
     except Exception as e:
         raise Exception(f"OCR extraction failed: {str(e)}")
 
-def extract_text_from_txt_file(file_content: bytes) -> str:
+def extract_text_from_txt_file(file_content: FileSource) -> str:
     """Extract text from TXT content."""
     try:
-        return file_content.decode('utf-8').strip()
+        return str(_as_bytes(file_content), 'utf-8').strip()
     except Exception as e:
         raise Exception(f"TXT extraction failed: {str(e)}")
 
-def extract_text(file_content: bytes, file_extension: str) -> str:
-    """Universal text extraction from file content."""
+def extract_text(file_content: FileSource, file_extension: str) -> str:
+    """Universal text extraction from file content (bytes or a file object)."""
     file_extension = file_extension.lower()
     
     if file_extension == '.pdf':
         return extract_text_from_pdf_file(file_content)
     elif file_extension == '.docx':
         return extract_text_from_docx_file(file_content)
-    elif file_extension in ['.png', '.jpg', '.jpeg']:
+    elif file_extension in IMAGE_EXTENSIONS:
         return extract_text_from_image_file(file_content)
     elif file_extension == '.txt':
         return extract_text_from_txt_file(file_content)
@@ -85,4 +117,12 @@ def get_preview_text(text: str, max_chars: int = 200) -> str:
     preview = text[:max_chars].replace('\n', ' ')
     if len(text) > max_chars:
         preview += "..."
-    return preview
\ No newline at end of file
+    return preview
+
+def extract_and_chunk(file_content: FileSource, file_extension: str, doc_id: str,
+                      chunk_size: int = 1000, overlap: int = 200) -> Tuple[str, List[Dict]]:
+    """Extract and chunk in one call so uploads can run in a worker process."""
+    text = extract_text(file_content, file_extension)
+    if not text or len(text.strip()) < 50:
+        return text, []
+    return text, chunk_text(text, doc_id, chunk_size=chunk_size, overlap=overlap)